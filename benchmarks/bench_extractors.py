@@ -0,0 +1,186 @@
+"""
+Benchmark and regression-check the extractors on the stored HTML corpus.
+
+benchmarks/fixtures/ holds listing and detail pages covering the edge cases the parsers
+have to handle (JSON-LD present, missing, malformed or wrapped in a list, hydration
+state listing similar ads, installment ads, Arabic-Indic digits, unknown brands, empty pages). Every extractor is run over
+every fixture it applies to; outputs are compared with fixtures/golden.json and
+throughput is reported per extractor. Fully offline: online translation lookups
+behave as if nothing was found.
+
+    python benchmarks/bench_extractors.py            # check against golden values and time
+    python benchmarks/bench_extractors.py --update   # rewrite golden.json after an intended change
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from patterns import scan_attributes  # noqa: E402
+from seen_index import card_fingerprint, post_id_from_url  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+GOLDEN_PATH = os.path.join(FIXTURES_DIR, 'golden.json')
+BASE_URL = "https://jo.opensooq.com"
+# Ad URLs of the detail fixtures whose hydration state also lists other ads: the post ID
+# in the URL decides which record belongs to the page
+DETAIL_URLS = {
+    'hydration_similar_ads': f"{BASE_URL}/ar/search/254400120/toyota-prius-2019",
+    'hydration_only_similar': f"{BASE_URL}/ar/search/253118640/hyundai-sonata-2019",
+    'hydration_partial_own': f"{BASE_URL}/ar/search/253118640/hyundai-sonata-2019",
+}
+
+
+class OfflineCache:
+    """Stands in for the translation cache so Wikipedia/Google lookups never leave the machine."""
+
+    def lookup(self, backend, text, target, fetch):
+        return None
+
+
+def load_fixtures(kind):
+    folder = os.path.join(FIXTURES_DIR, kind)
+    fixtures = {}
+    for name in sorted(os.listdir(folder)):
+        if name.endswith('.html'):
+            with open(os.path.join(folder, name), encoding='utf-8') as f:
+                fixtures[name[:-5]] = f.read()
+    return fixtures
+
+
+def page_summary(page):
+    return {'h1': page.h1, 'json_ld': page.json_ld is not None, 'body_chars': len(page.body_text)}
+
+
+def detail_summary(detail):
+    return {k: v for k, v in detail.items() if k != 'page_text'}
+
+
+def is_installment(page):
+    price_text, price_num = main.extract_price_from_page(page)
+    fuel = main.extract_fuel_type_advanced(page)
+    return main.is_installment_advanced(price_text, page.body_text, fuel, price_num, page.attributes)
+
+
+# (extractor name, input kind, function)
+EXTRACTORS = [
+    ('extract_json_ld', 'detail_html', main.extract_json_ld),
+    ('DetailPage', 'detail_html', lambda html: page_summary(main.DetailPage(html))),
+    ('parse_detail_html', 'detail_html', lambda html: detail_summary(main.parse_detail_html(html))),
+    ('parse_detail_html (url)', 'detail_ad', lambda ad: detail_summary(main.parse_detail_html(*ad))),
+    ('extract_model_from_page', 'detail_page', main.extract_model_from_page),
+    ('extract_price_from_page', 'detail_page', main.extract_price_from_page),
+    ('extract_fuel_type_advanced', 'detail_page', main.extract_fuel_type_advanced),
+    ('extract_transmission_from_page', 'detail_page', main.extract_transmission_from_page),
+    ('extract_color_from_page', 'detail_page', main.extract_color_from_page),
+    ('extract_insurance_from_page', 'detail_page', main.extract_insurance_from_page),
+    ('is_installment_advanced', 'detail_page', is_installment),
+    ('scan_attributes', 'detail_page', lambda page: scan_attributes(page.body_text)),
+    ('extract_year (page)', 'detail_page', lambda page: main.extract_year(page.body_text)),
+    ('parse_listing_html', 'listing_html', lambda html: main.parse_listing_html(html, BASE_URL)),
+    ('extract_model_from_card', 'card', main.extract_model_from_card),
+    ('extract_brand_model_from_text', 'card', lambda card: main.extract_brand_model_from_text(card['text'])),
+    ('extract_year (card)', 'card', lambda card: main.extract_year(card['text'])),
+    ('extract_mileage', 'card', lambda card: main.extract_mileage(card['text'])),
+    ('extract_condition', 'card', lambda card: main.extract_condition(card['text'])),
+    ('extract_seller_type', 'card', main.extract_seller_type),
+    ('card_fingerprint', 'card', card_fingerprint),
+    ('post_id_from_url', 'card', lambda card: post_id_from_url(card['href'])),
+    ('split_car_model', 'title', main.split_car_model),
+    ('translate_car_model_smart', 'title', main.translate_car_model_smart),
+]
+
+
+def build_inputs():
+    detail_html = load_fixtures('detail')
+    listing_html = load_fixtures('listing')
+    cards = {}
+    for name, html in listing_html.items():
+        for i, card in enumerate(main.parse_listing_html(html, BASE_URL)['cards']):
+            cards[f"{name}#{i}"] = card
+    return {
+        'detail_html': detail_html,
+        'detail_page': {name: main.DetailPage(html) for name, html in detail_html.items()},
+        'detail_ad': {name: (detail_html[name], url) for name, url in DETAIL_URLS.items()},
+        'listing_html': listing_html,
+        'card': cards,
+        'title': {key: main.extract_model_from_card(card) for key, card in cards.items()},
+    }
+
+
+def jsonable(value):
+    """Outputs as plain JSON values (NaN -> None, tuples -> lists) so they compare with golden.json."""
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, dict):
+        return {k: jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [jsonable(v) for v in value]
+    return value
+
+
+def run_extractor(func, inputs, min_time):
+    """Outputs for every input, and calls per second over repeated passes lasting at least min_time."""
+    outputs = {key: jsonable(func(value)) for key, value in inputs.items()}
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for value in inputs.values():
+            func(value)
+        calls += len(inputs)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return outputs, calls / elapsed
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Offline extractor benchmark with golden-value checks")
+    parser.add_argument('--update', action='store_true', help="rewrite golden.json from the current outputs")
+    parser.add_argument('--only', help="run only extractors whose name contains this text")
+    parser.add_argument('--min-time', type=float, default=0.2, help="seconds to time each extractor for")
+    args = parser.parse_args()
+
+    main.get_translation_cache = OfflineCache
+    inputs = build_inputs()
+    golden = {}
+    if os.path.exists(GOLDEN_PATH) and not args.update:
+        with open(GOLDEN_PATH, encoding='utf-8') as f:
+            golden = json.load(f)
+
+    results = {}
+    failures = 0
+    for name, kind, func in EXTRACTORS:
+        if args.only and args.only not in name:
+            continue
+        outputs, rate = run_extractor(func, inputs[kind], args.min_time)
+        results[name] = outputs
+        expected = golden.get(name)
+        if args.update:
+            status = "updated"
+        elif expected is None:
+            status = "NO GOLDEN"
+            failures += 1
+        else:
+            wrong = sorted(key for key in set(expected) | set(outputs) if expected.get(key) != outputs.get(key))
+            status = "ok" if not wrong else f"MISMATCH {', '.join(wrong)}"
+            failures += bool(wrong)
+        print(f"{name:<32} {len(inputs[kind]):>3} inputs | {rate:>10,.0f} calls/s | {1e6 / rate:>8.1f} µs/call | {status}")
+
+    if args.update:
+        if args.only and os.path.exists(GOLDEN_PATH):
+            with open(GOLDEN_PATH, encoding='utf-8') as f:
+                results = {**json.load(f), **results}
+        with open(GOLDEN_PATH, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=1, sort_keys=True)
+            f.write('\n')
+        print(f"\nWrote {GOLDEN_PATH}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,121 @@
+"""
+Benchmark split_car_model: original nested substring scans vs the automaton matcher.
+
+Runs with the real dictionaries and with synthetic dictionaries 10x their size,
+checks that both implementations return identical results, and reports titles/second.
+
+    python benchmarks/bench_matcher.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import BRAND_TRANSLATION, MODEL_TRANSLATION, TRIM_KEYWORDS  # noqa: E402
+from matcher import CarNameMatcher  # noqa: E402
+
+ARABIC_LETTERS = 'ابتثجحخدذرزسشصضطظعغفقكلمنهوي'
+FILLER_WORDS = ['للبيع', 'موديل', 'فل', 'كامل', 'نظيف', '2018', '2021', 'فحص', 'sport', 'limited', 'se', 'gt']
+
+
+def naive_split(text, brands, models, trims):
+    """The original split_car_model, parameterised by its dictionaries."""
+    text = text.strip()
+    brand = None
+    model = None
+    trim = []
+    remaining = []
+    for ar_brand in brands:
+        if ar_brand in text:
+            brand = ar_brand
+            text = text.replace(ar_brand, '', 1).strip()
+            break
+    words = text.split()
+    for word in words:
+        found = False
+        for ar_model in models:
+            if ar_model in word or word in ar_model:
+                model = ar_model
+                text = text.replace(ar_model, '', 1).strip()
+                found = True
+                break
+        if found:
+            break
+    words = text.split()
+    for word in words:
+        word_lower = word.lower()
+        matched = False
+        for trim_name, keywords in trims.items():
+            if word_lower in keywords or any(kw in word_lower for kw in keywords):
+                trim.append(trim_name)
+                text = text.replace(word, '', 1).strip()
+                matched = True
+                break
+        if not matched:
+            remaining.append(word)
+    extra = ' '.join(remaining).strip()
+    if extra and not model:
+        model = extra
+        extra = ''
+    return {'brand': brand, 'model': model, 'trim': ' '.join(trim) if trim else None, 'extra': extra if extra else None}
+
+
+def random_word(rng, low=3, high=8):
+    return ''.join(rng.choice(ARABIC_LETTERS) for _ in range(rng.randint(low, high)))
+
+
+def scaled_dictionaries(rng, factor):
+    brands = list(BRAND_TRANSLATION)
+    models = list(MODEL_TRANSLATION)
+    trims = {name: list(keywords) for name, keywords in TRIM_KEYWORDS.items()}
+    for _ in range((factor - 1) * len(BRAND_TRANSLATION)):
+        brands.append(random_word(rng, 4, 9))
+    for _ in range((factor - 1) * len(MODEL_TRANSLATION)):
+        models.append(random_word(rng, 4, 9) if rng.random() < 0.8 else f"{random_word(rng)} {rng.randint(1, 9)}")
+    for i in range((factor - 1) * len(TRIM_KEYWORDS)):
+        trims[f"Trim{i}"] = [random_word(rng, 5, 8)]
+    return brands, models, trims
+
+
+def make_titles(rng, brands, models, count):
+    titles = []
+    for _ in range(count):
+        words = [rng.choice(brands), rng.choice(models)]
+        words += rng.sample(FILLER_WORDS, rng.randint(0, 4))
+        if rng.random() < 0.2:
+            words.append(random_word(rng))
+        rng.shuffle(words[1:])
+        titles.append(' '.join(words))
+    return titles
+
+
+def titles_per_second(func, titles):
+    start = time.perf_counter()
+    for title in titles:
+        func(title)
+    return len(titles) / (time.perf_counter() - start)
+
+
+def run(factor, count=5000, seed=42):
+    rng = random.Random(seed)
+    brands, models, trims = scaled_dictionaries(rng, factor)
+    titles = make_titles(rng, brands, models, count)
+
+    build_start = time.perf_counter()
+    matcher = CarNameMatcher(brands, models, trims)
+    build_ms = (time.perf_counter() - build_start) * 1000
+
+    mismatches = sum(naive_split(t, brands, models, trims) != matcher.split(t) for t in titles)
+    naive = titles_per_second(lambda t: naive_split(t, brands, models, trims), titles)
+    fast = titles_per_second(matcher.split, titles)
+    print(f"{factor:>3}x dictionaries ({len(brands)} brands, {len(models)} models): "
+          f"naive {naive:>9,.0f} titles/s | automaton {fast:>9,.0f} titles/s | "
+          f"speedup {fast / naive:5.1f}x | build {build_ms:.0f} ms | mismatches {mismatches}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    failures = sum(run(factor) for factor in (1, 10))
+    sys.exit(1 if failures else 0)
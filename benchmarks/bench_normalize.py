@@ -0,0 +1,101 @@
+"""
+Benchmark the Price / Mileage / Year post-processing: scalar functions applied row by
+row vs the vectorized column functions in normalize.py.
+
+Builds a synthetic corpus of scraped values (Arabic-Indic and Western digits, ranges,
+open-ended mileage, out-of-range years, placeholders), checks that both paths return
+identical values, and reports the time for each at 10k and 100k rows.
+
+    python benchmarks/bench_normalize.py
+"""
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import clean_price_number, convert_arabic_numbers, extract_year, mileage_bounds  # noqa: E402
+from normalize import parse_mileage, parse_price, parse_year  # noqa: E402
+
+PLACEHOLDERS = ["N/A", "غير محدد", "غير متوفر", "", None]
+
+
+def digits(rng, number):
+    text = f"{number:,}" if rng.random() < 0.7 else str(number)
+    return text.translate(str.maketrans('0123456789', '٠١٢٣٤٥٦٧٨٩')) if rng.random() < 0.3 else text
+
+
+def make_corpus(rng, count):
+    prices, mileages, years = [], [], []
+    for _ in range(count):
+        if rng.random() < 0.1:
+            prices.append(rng.choice(PLACEHOLDERS))
+        else:
+            price = digits(rng, rng.randint(1500, 90000))
+            prices.append(rng.choice([f"{price} دينار", f"JOD {price}", price, f"{price}.{rng.randint(0, 99)} د.أ"]))
+
+        if rng.random() < 0.1:
+            mileages.append(rng.choice(PLACEHOLDERS))
+        else:
+            low = rng.randint(0, 30) * 10000
+            mileages.append(rng.choice([
+                f"{digits(rng, low)} - {digits(rng, low + 9999)} كم",
+                f"+{digits(rng, low)} كم",
+                f"{digits(rng, low)} km",
+            ]))
+
+        if rng.random() < 0.1:
+            years.append(rng.choice(PLACEHOLDERS))
+        else:
+            year = digits(rng, rng.randint(1950, 2030)).replace(',', '').replace('٬', '')
+            years.append(rng.choice([year, f"موديل {year}", f"{rng.randint(2026, 2099)} / {year}", f"{year}م", f"model{year}"]))
+    return pd.DataFrame({'Price': prices, 'Mileage': mileages, 'Year': years})
+
+
+def scalar_year(value):
+    if not isinstance(value, str):
+        return None
+    year = extract_year(value)
+    return int(year) if year != "N/A" else None
+
+
+def scalar(df):
+    price = df['Price'].apply(clean_price_number)
+    bounds = df['Mileage'].apply(lambda v: mileage_bounds(convert_arabic_numbers(v)) if isinstance(v, str) else (None, None))
+    year = df['Year'].apply(scalar_year)
+    return price, bounds.apply(lambda b: b[0]), bounds.apply(lambda b: b[1]), year
+
+
+def vectorized(df):
+    low, high = parse_mileage(df['Mileage'])
+    return parse_price(df['Price']), low, high, parse_year(df['Year'])
+
+
+def same(a, b):
+    a = pd.Series(a, dtype='Float64').reset_index(drop=True)
+    b = pd.Series(b, dtype='Float64').reset_index(drop=True)
+    return int(((a != b).fillna(True) & ~(a.isna() & b.isna())).sum())
+
+
+def timed(func, df):
+    start = time.perf_counter()
+    result = func(df)
+    return result, time.perf_counter() - start
+
+
+def run(count, seed=42):
+    df = make_corpus(random.Random(seed), count)
+    expected, scalar_s = timed(scalar, df)
+    actual, vector_s = timed(vectorized, df)
+    mismatches = sum(same(e, a) for e, a in zip(expected, actual))
+    print(f"{count:>7,} rows: row by row {scalar_s * 1000:>8.0f} ms | vectorized {vector_s * 1000:>6.0f} ms | "
+          f"speedup {scalar_s / vector_s:5.1f}x | mismatches {mismatches}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    failures = sum(run(count) for count in (10_000, 100_000))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,112 @@
+"""
+Exercise the rate controller against a local stub server that pushes back under load.
+
+The stub answers 429 (with a Retry-After of --retry-after seconds) once more than
+--capacity requests are in flight, and slows every response down by --slowdown seconds
+per request in flight. A thread pool fetches --requests pages through one RateController
+and the run reports throughput, what the server had to reject, the retries made and the
+concurrency limit the controller settled on. Fully offline.
+
+    python benchmarks/bench_rate_control.py
+    python benchmarks/bench_rate_control.py --capacity 2 --threads 16 --requests 300
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests  # noqa: E402
+
+from metrics import METRICS  # noqa: E402
+from rate_control import RateController  # noqa: E402
+
+
+class StubState:
+    def __init__(self, capacity, slowdown, retry_after):
+        self.capacity = capacity
+        self.slowdown = slowdown
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.peak = 0
+        self.served = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with state.lock:
+                state.in_flight += 1
+                state.peak = max(state.peak, state.in_flight)
+                load = state.in_flight
+            try:
+                if load > state.capacity:
+                    with state.lock:
+                        state.rejected += 1
+                    self.send_response(429)
+                    self.send_header('Retry-After', str(state.retry_after))
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                time.sleep(0.01 + state.slowdown * load)
+                body = b"<html><body>ok</body></html>"
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with state.lock:
+                    state.served += 1
+            finally:
+                with state.lock:
+                    state.in_flight -= 1
+
+        def log_message(self, *args):
+            pass
+    return Handler
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Rate controller against a stub server that throttles")
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16, help="client threads (the controller picks how many run at once)")
+    parser.add_argument('--capacity', type=int, default=6, help="requests in flight before the stub answers 429")
+    parser.add_argument('--slowdown', type=float, default=0.005, help="extra seconds per request in flight")
+    parser.add_argument('--retry-after', type=float, default=0.2)
+    parser.add_argument('--rate', type=float, default=200.0, help="token bucket rate for the stub host")
+    args = parser.parse_args()
+
+    state = StubState(args.capacity, args.slowdown, args.retry_after)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    controller = RateController(rate=args.rate, burst=args.threads, max_concurrency=args.threads)
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=args.threads))
+
+    def fetch(i):
+        response = controller.request(session, f"{base}/ad/{i}", timeout=10)
+        return response is not None and response.status_code == 200
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        ok = sum(pool.map(fetch, range(args.requests)))
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    host_state = controller.report()[base[len('http://'):]]
+    print(f"{ok}/{args.requests} pages in {elapsed:.2f}s ({ok / elapsed:.1f} pages/s)")
+    print(f"server: capacity {args.capacity}, peak in flight {state.peak}, {state.rejected} rejected with 429")
+    print(f"client: {METRICS.total('http_retries_total')} retries, final concurrency limit {host_state['limit']}, "
+          f"latency {host_state['latency'] * 1000:.0f} ms")
+    return 0 if ok == args.requests else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,102 @@
+"""
+Peak memory of the output stage: building full DataFrames at the end of the run
+(the previous path) vs the chunked streaming writers.
+
+Each case runs in a fresh subprocess so peak RSS isn't shared between them.
+Translation uses the built-in dictionaries only, so the benchmark runs offline.
+
+    python benchmarks/bench_writers.py            # 10k and 100k rows
+    python benchmarks/bench_writers.py 5000 20000
+"""
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODELS = ['تويوتا كامري', 'هيونداي النترا', 'كيا سبورتاج', 'مرسيدس الفئة-سي', 'تيسلا موديل 3', 'نيسان باترول']
+FUELS = ['بنزين', 'هايبرد', 'كهرباء', 'ديزل']
+CITIES = ['عمان', 'الزرقاء', 'إربد', 'العقبة']
+
+
+def synthetic_rows(count, seed=7):
+    rng = random.Random(seed)
+    for i in range(count):
+        yield {
+            'ID': i + 1,
+            'Model': f"{rng.choice(MODELS)} {rng.randint(2010, 2024)} فل كامل",
+            'Year': str(rng.randint(2005, 2024)),
+            'Condition': rng.choice(['مستعمل', 'جديد (زيرو)']),
+            'Fuel Type': rng.choice(FUELS),
+            'Mileage': f"{rng.randint(0, 20) * 10},000 - {rng.randint(0, 20) * 10 + 9},999 كم",
+            'Seller Type': rng.choice(['شخصي', 'معرض', 'معرض/وكالة']),
+            'Location': rng.choice(CITIES),
+            'Price': f"{rng.randint(3, 90)},{rng.randint(0, 999):03d} دينار",
+            'Insurance': rng.choice(['تأمين شامل', 'تأمين إلزامي', 'لا يوجد تأمين']),
+            'Transmission': rng.choice(['اوتوماتيك', 'يدوي']),
+            'Color': rng.choice(['أبيض', 'أسود', 'فضي']),
+        }
+
+
+def translate_offline(df):
+    from main import TRANSLATED_COLUMNS, TRANSLATION_DICT
+    for col in TRANSLATED_COLUMNS:
+        df[col] = df[col].map(lambda x: TRANSLATION_DICT.get(x, x))
+    return df
+
+
+def run_legacy(count, workdir):
+    import numpy as np
+    import pandas as pd
+    from writers import OUTPUT_COLUMNS, INVALID_VALUES
+    all_ads = list(synthetic_rows(count))
+    df = pd.DataFrame(all_ads)[OUTPUT_COLUMNS]
+    df.to_excel(os.path.join(workdir, 'cars_arabic.xlsx'), index=False)
+    df_en = translate_offline(df.copy())
+    df_en = df_en.replace(INVALID_VALUES, np.nan)
+    df_en.to_csv(os.path.join(workdir, 'jordan_cars_kaggle.csv'), index=False, encoding='utf-8-sig')
+
+
+def run_streaming(count, workdir):
+    from writers import StreamingOutput, ArabicExcelWriter, EnglishOutputs, EnglishCsvWriter
+    output = StreamingOutput([
+        ArabicExcelWriter(os.path.join(workdir, 'cars_arabic.xlsx')),
+        EnglishOutputs(translate_offline, [EnglishCsvWriter(os.path.join(workdir, 'jordan_cars_kaggle.csv'))]),
+    ])
+    for row in synthetic_rows(count):
+        output.add(row)
+    output.close()
+
+
+def child(mode, count):
+    import main  # noqa: F401  (same imports as a real run in both cases)
+    with tempfile.TemporaryDirectory() as workdir:
+        start = time.perf_counter()
+        {'legacy': run_legacy, 'streaming': run_streaming}[mode](count, workdir)
+        elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{peak_mb:.1f} {elapsed:.2f}")
+
+
+def measure(mode, count):
+    out = subprocess.run([sys.executable, __file__, '--child', mode, str(count)],
+                         capture_output=True, text=True, check=True, cwd=ROOT)
+    peak_mb, elapsed = out.stdout.split()[-2:]
+    return float(peak_mb), float(elapsed)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(sys.argv[2], int(sys.argv[3]))
+        sys.exit(0)
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    for count in sizes:
+        legacy_mb, legacy_s = measure('legacy', count)
+        stream_mb, stream_s = measure('streaming', count)
+        print(f"{count:>8,} rows: legacy peak RSS {legacy_mb:7.1f} MB ({legacy_s:5.1f}s) | "
+              f"streaming peak RSS {stream_mb:7.1f} MB ({stream_s:5.1f}s)")
@@ -0,0 +1,202 @@
+"""
+Local HTTP cache with conditional revalidation, for pages refetched between runs.
+
+Responses are stored in a SQLite file keyed by URL, together with their validators
+(ETag, Last-Modified) and an expiry time taken from Cache-Control max-age or Expires,
+or estimated when the server gives neither. A fresh entry is served without a request.
+A stale one is revalidated with If-None-Match / If-Modified-Since, and a 304 serves
+the stored body again. Stored bodies are compressed, and once the cache grows past
+max_bytes the least recently used entries are evicted.
+"""
+import sqlite3
+import threading
+import time
+import zlib
+from email.utils import parsedate_to_datetime
+
+DEFAULT_CACHE_PATH = "http_cache.sqlite3"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_TTL = 12 * 3600        # freshness when the server gives no max-age or Expires
+HEURISTIC_FRACTION = 0.1       # ... or this share of the time since Last-Modified, if shorter
+EVICT_TO = 0.9                 # eviction frees space down to this share of max_bytes
+GONE_STATUSES = (404, 410)     # the ad was removed; its entry goes too
+
+
+def _http_time(value):
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def cache_directives(headers):
+    directives = {}
+    for part in (headers.get('Cache-Control') or '').lower().split(','):
+        name, _, value = part.strip().partition('=')
+        if name:
+            directives[name] = value.strip('"')
+    return directives
+
+
+def freshness_lifetime(headers, default_ttl=DEFAULT_TTL, now=None):
+    """Seconds a response stays fresh, or None if it must not be stored (no-store)."""
+    now = time.time() if now is None else now
+    directives = cache_directives(headers)
+    if 'no-store' in directives:
+        return None
+    if 'no-cache' in directives:
+        return 0
+    if 'max-age' in directives:
+        try:
+            return max(0, int(directives['max-age']))
+        except ValueError:
+            return 0
+    expires = _http_time(headers.get('Expires'))
+    if expires is not None:
+        date = _http_time(headers.get('Date')) or now
+        return max(0, expires - date)
+    last_modified = _http_time(headers.get('Last-Modified'))
+    if last_modified is not None:
+        return min(default_ttl, max(0, (now - last_modified) * HEURISTIC_FRACTION))
+    return default_ttl
+
+
+class HttpCache:
+    """SQLite-backed response cache with validators, LRU size cap and hit/miss counters.
+
+    get(url, fetch) returns (status, text). fetch(headers) makes the actual request with the
+    given conditional headers and returns a requests response, or None if it failed.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, default_ttl=DEFAULT_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " url TEXT PRIMARY KEY,"
+            " body BLOB NOT NULL,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " expires REAL NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._conn.commit()
+        self.size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self.stats = {'fresh_hits': 0, 'revalidated': 0, 'stale_served': 0, 'misses': 0}
+        self.evictions = 0
+        self.bytes_saved = 0           # characters served from disk instead of downloaded
+
+    def _entry(self, url):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT body, etag, last_modified, expires FROM responses WHERE url = ?", (url,)).fetchone()
+
+    def _served(self, url, body, stat, expires=None, etag=None, last_modified=None):
+        """Text of a stored body, counted under stat; a 304 also refreshes expiry and validators."""
+        text = zlib.decompress(body).decode('utf-8')
+        with self._lock:
+            self.stats[stat] += 1
+            self.bytes_saved += len(text)
+            if expires is None:
+                self._conn.execute("UPDATE responses SET accessed = ? WHERE url = ?", (time.time(), url))
+            else:
+                self._conn.execute(
+                    "UPDATE responses SET accessed = ?, expires = ?, etag = COALESCE(?, etag),"
+                    " last_modified = COALESCE(?, last_modified) WHERE url = ?",
+                    (time.time(), expires, etag, last_modified, url))
+            self._conn.commit()
+        return text
+
+    def get(self, url, fetch):
+        entry = self._entry(url)
+        now = time.time()
+        if entry is not None and entry[3] > now:
+            return 200, self._served(url, entry[0], 'fresh_hits')
+
+        headers = {}
+        if entry is not None:
+            if entry[1]:
+                headers['If-None-Match'] = entry[1]
+            if entry[2]:
+                headers['If-Modified-Since'] = entry[2]
+        response = fetch(headers)
+
+        if entry is not None and (response is None or response.status_code >= 500):
+            # Better an older copy than nothing while the site is failing
+            return 200, self._served(url, entry[0], 'stale_served')
+        if response is None:
+            with self._lock:
+                self.stats['misses'] += 1
+            return None, None
+        if response.status_code == 304 and entry is not None:
+            lifetime = freshness_lifetime(response.headers, self.default_ttl, now)
+            return 200, self._served(url, entry[0], 'revalidated', now + (lifetime or 0),
+                                     response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+        with self._lock:
+            self.stats['misses'] += 1
+        if response.status_code == 200:
+            self.store(url, response, now)
+        elif response.status_code in GONE_STATUSES and entry is not None:
+            self.discard(url)
+        return response.status_code, response.text
+
+    def store(self, url, response, now=None):
+        now = time.time() if now is None else now
+        lifetime = freshness_lifetime(response.headers, self.default_ttl, now)
+        if lifetime is None:
+            self.discard(url)
+            return
+        body = zlib.compress(response.text.encode('utf-8'))
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (url, body, etag, last_modified, expires, size, accessed)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, body, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+                 now + lifetime, len(body), now),
+            )
+            self.size += len(body) - (old[0] if old else 0)
+            if self.size > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is back under EVICT_TO of max_bytes."""
+        target = self.max_bytes * EVICT_TO
+        victims = []
+        for url, size in self._conn.execute("SELECT url, size FROM responses ORDER BY accessed"):
+            if self.size <= target:
+                break
+            victims.append((url,))
+            self.size -= size
+        self._conn.executemany("DELETE FROM responses WHERE url = ?", victims)
+        self.evictions += len(victims)
+
+    def discard(self, url):
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            if old:
+                self._conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+                self._conn.commit()
+                self.size -= old[0]
+
+    def hit_rate(self):
+        hits = self.stats['fresh_hits'] + self.stats['revalidated']
+        total = hits + self.stats['stale_served'] + self.stats['misses']
+        return hits / total if total else 0.0
+
+    def summary(self):
+        return (f"{self.stats['fresh_hits']} fresh hits, {self.stats['revalidated']} revalidated (304), "
+                f"{self.stats['misses']} misses, {self.stats['stale_served']} stale served, "
+                f"{self.evictions} evicted, {self.bytes_saved / 1e6:.1f} MB not downloaded, "
+                f"hit rate {self.hit_rate():.0%}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
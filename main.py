@@ -1,21 +1,38 @@
 import time
 import re
-import json
-import pandas as pd
-import numpy as np
+import sys
+import argparse
+import os
+import socket
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
 import requests
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
-from webdriver_manager.chrome import ChromeDriverManager
-import arabic_reshaper
-from bidi.algorithm import get_display
-from urllib.parse import urljoin, quote
-from deep_translator import GoogleTranslator
+from requests.adapters import HTTPAdapter
+from urllib.parse import urljoin, urlparse, urlunparse, parse_qsl, urlencode, quote
+from matcher import CarNameMatcher
+from patterns import scan_attributes
+from structured_data import StructuredData
+from metrics import METRICS, timed_extractor
+from rate_control import RateController
+from run_journal import RunJournal, DEFAULT_JOURNAL_PATH
+from shards import ShardQueue, ShardWriter, DEFAULT_QUEUE_PATH, DEFAULT_SHARD_DIR, page_range_shards, query_shards, iter_merged_rows
+from seen_index import SeenIndex, RepostIndex, DEFAULT_INDEX_PATH, UNCHANGED, post_id_from_url, card_fingerprint, content_key
+from translation_cache import TranslationCache, DEFAULT_CACHE_PATH, MISSING
+from http_cache import HttpCache, DEFAULT_CACHE_PATH as DEFAULT_HTTP_CACHE_PATH, DEFAULT_MAX_BYTES as DEFAULT_HTTP_CACHE_MAX_BYTES
+# The heavy libraries (pandas/numpy, selenium, bs4, deep_translator, arabic_reshaper/bidi and
+# the writers' pyarrow/openpyxl) are imported inside the stages that use them, so a crawl
+# starts fetching straight away and a run that never needs a browser never loads selenium.
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 
 # -------------------- Basic translation settings --------------------
 TRANSLATION_DICT = {
@@ -256,83 +273,75 @@ TRIM_KEYWORDS = {
 # List of brands for model extraction
 CAR_BRANDS = list(BRAND_TRANSLATION.keys())
 
+# Brand/model/trim matcher built once from the dictionaries above
+CAR_NAME_MATCHER = CarNameMatcher(CAR_BRANDS, MODEL_TRANSLATION, TRIM_KEYWORDS)
+
 # -------------------- Smart model translation functions --------------------
+TRANSLATION_CACHE_PATH = DEFAULT_CACHE_PATH
+_translation_cache = None
+
+def get_translation_cache():
+    """Open the on-disk translation cache on first use."""
+    global _translation_cache
+    if _translation_cache is None:
+        _translation_cache = TranslationCache(TRANSLATION_CACHE_PATH)
+    return _translation_cache
+
+# Detail pages and Wikipedia articles rarely change between runs: fresh copies are served
+# from disk and stale ones revalidated with conditional requests (see http_cache.py)
+HTTP_CACHE = True
+HTTP_CACHE_PATH = DEFAULT_HTTP_CACHE_PATH
+HTTP_CACHE_MAX_BYTES = DEFAULT_HTTP_CACHE_MAX_BYTES
+_http_cache = None
+_http_cache_lock = threading.Lock()
+
+def get_http_cache():
+    """Open the on-disk HTTP cache on first use; None when HTTP_CACHE is off.
+
+    The first calls come from the detail and translation thread pools at once, so opening
+    is locked: one cache, one connection and one size count for the byte cap.
+    """
+    global _http_cache
+    if _http_cache is None and HTTP_CACHE:
+        with _http_cache_lock:
+            if _http_cache is None:
+                _http_cache = HttpCache(HTTP_CACHE_PATH, HTTP_CACHE_MAX_BYTES)
+    return _http_cache
+
 def search_car_model_online(car_name):
     """
     Search for car model translation online (Wikipedia)
     """
-    try:
-        search_query = quote(f"{car_name} car")
-        url = f"https://en.wikipedia.org/wiki/{search_query.replace(' ', '_')}"
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-        response = requests.get(url, headers=headers, timeout=5)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            title = soup.find('h1', {'id': 'firstHeading'})
-            if title:
-                return title.text.strip()
-    except:
-        pass
-    return None
+    def fetch():
+        from bs4 import BeautifulSoup
+        try:
+            search_query = quote(f"{car_name} car")
+            url = f"https://en.wikipedia.org/wiki/{search_query.replace(' ', '_')}"
+            headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+            fetch_page = lambda conditional: RATE_LIMITER.request(requests, url, timeout=5, headers={**headers, **conditional})
+            cache = get_http_cache()
+            if cache is not None:
+                status, text = cache.get(url, fetch_page)
+            else:
+                response = fetch_page({})
+                status, text = (response.status_code, response.text) if response is not None else (None, None)
+            if status == 200:
+                soup = BeautifulSoup(text, 'html.parser')
+                title = soup.find('h1', {'id': 'firstHeading'})
+                if title:
+                    return title.text.strip()
+        except:
+            pass
+        return None
+    return get_translation_cache().lookup('wikipedia', car_name, 'en', fetch)
 
 def split_car_model(text):
     """
     Split car name into parts: brand, model, trim
     """
-    text = text.strip()
-    original = text
-    brand = None
-    model = None
-    trim = []
-    remaining = []
-
-    # Search for brand
-    for ar_brand in BRAND_TRANSLATION.keys():
-        if ar_brand in text:
-            brand = ar_brand
-            text = text.replace(ar_brand, '', 1).strip()
-            break
-
-    # Search for model
-    words = text.split()
-    for word in words:
-        found = False
-        for ar_model in MODEL_TRANSLATION.keys():
-            if ar_model in word or word in ar_model:
-                model = ar_model
-                text = text.replace(ar_model, '', 1).strip()
-                found = True
-                break
-        if found:
-            break
-
-    # Search for trim keywords
-    words = text.split()
-    for word in words:
-        word_lower = word.lower()
-        matched = False
-        for trim_name, keywords in TRIM_KEYWORDS.items():
-            if word_lower in keywords or any(kw in word_lower for kw in keywords):
-                trim.append(trim_name)
-                text = text.replace(word, '', 1).strip()
-                matched = True
-                break
-        if not matched:
-            remaining.append(word)
-
-    # Clean up remaining text
-    extra = ' '.join(remaining).strip()
-    if extra and not model:
-        model = extra
-        extra = ''
-
-    return {
-        'brand': brand,
-        'model': model,
-        'trim': ' '.join(trim) if trim else None,
-        'extra': extra if extra else None
-    }
+    return CAR_NAME_MATCHER.split(text)
 
+@timed_extractor
 def translate_car_model_smart(text):
     """
     Smart translation of car names using dictionaries and online search.
@@ -384,22 +393,115 @@ def translate_text_fallback(text, target='en'):
     """Translate plain text using dictionary or automatic translation."""
     if text in TRANSLATION_DICT:
         return TRANSLATION_DICT[text]
+    if not isinstance(text, str) or not text.strip():
+        return text
+
+    def fetch():
+        from deep_translator import GoogleTranslator
+        try:
+            translator = GoogleTranslator(source='ar', target=target)
+            translated = RATE_LIMITER.call(TRANSLATE_URL, lambda: translator.translate(text))
+            if translated and translated != text:
+                return translated
+        except:
+            pass
+        return None
+    translated = get_translation_cache().lookup('google', text, target, fetch)
+    return translated if translated else text
+
+# -------------------- Column translation --------------------
+# The English export translates each distinct value once: dictionary hits first, then the
+# on-disk cache, and only the remaining strings go to the backend in batched requests.
+TRANSLATED_COLUMNS = ['Condition', 'Fuel Type', 'Seller Type', 'Location', 'Insurance', 'Transmission', 'Color']
+TRANSLATION_BATCH_CHARS = 4500   # GoogleTranslator rejects requests over 5000 characters
+TRANSLATE_URL = "https://translate.google.com"   # host the translation requests are paced under
+TRANSLATION_WORKERS = 4
+
+def chunk_texts(texts, max_chars=TRANSLATION_BATCH_CHARS):
+    chunk, size = [], 0
+    for text in texts:
+        if chunk and size + len(text) + 1 > max_chars:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(text)
+        size += len(text) + 1
+    if chunk:
+        yield chunk
+
+def translate_batch(texts, target='en'):
+    """Translate a chunk of strings with as few requests as possible.
+
+    deep_translator's translate_batch issues one request per string, so the chunk is sent as
+    newline-separated text and split back; translate_batch is only used if the line count changes.
+    """
+    from deep_translator import GoogleTranslator
+    translator = GoogleTranslator(source='ar', target=target)
     try:
-        translated = GoogleTranslator(source='ar', target=target).translate(text)
-        if translated and translated != text:
-            return translated
+        joined = RATE_LIMITER.call(TRANSLATE_URL, lambda: translator.translate('\n'.join(texts)))
+        lines = joined.split('\n') if joined else []
+        if len(lines) == len(texts):
+            return [line.strip() for line in lines]
     except:
         pass
-    return text
-
-def translate_text(text, target='en'):
-    # General function for other texts (not model)
-    return translate_text_fallback(text, target)
+    try:
+        return RATE_LIMITER.call(TRANSLATE_URL, lambda: translator.translate_batch(texts))
+    except:
+        return [None] * len(texts)
+
+def translate_values(values, target='en'):
+    """Return a {source: translation} mapping for a collection of distinct values."""
+    cache = get_translation_cache()
+    mapping = {}
+    pending = []
+    for value in values:
+        if value in TRANSLATION_DICT:
+            mapping[value] = TRANSLATION_DICT[value]
+        elif not isinstance(value, str) or not value.strip():
+            mapping[value] = value
+        else:
+            cached = cache.get('google', value, target)
+            if cached is MISSING:
+                pending.append(value)
+            else:
+                mapping[value] = cached or value
+
+    chunks = list(chunk_texts(pending))
+    if chunks:
+        with ThreadPoolExecutor(max_workers=TRANSLATION_WORKERS) as pool:
+            for chunk, translated in zip(chunks, pool.map(lambda c: translate_batch(c, target), chunks)):
+                for source, result in zip(chunk, translated):
+                    result = result if result and result != source else None
+                    cache.set('google', source, target, result)
+                    mapping[source] = result or source
+    return mapping
+
+def translate_columns(df, columns=TRANSLATED_COLUMNS, target='en'):
+    """Translate the distinct values of several columns together and map them back in place."""
+    import pandas as pd
+    mapping = translate_values(pd.unique(df[columns].values.ravel()), target)
+    for col in columns:
+        df[col] = df[col].map(mapping)
+    return df
+
+@METRICS.timed('stage_seconds', stage='translate')
+def translate_frame(df):
+    """English version of a chunk of rows: text columns and models translated."""
+    translate_columns(df, TRANSLATED_COLUMNS)
+    return translate_model_column(df)
+
+def translate_model_column(df, column='Model'):
+    models = df[column].dropna().unique()
+    with ThreadPoolExecutor(max_workers=TRANSLATION_WORKERS) as pool:
+        mapping = dict(zip(models, pool.map(translate_car_model_smart, models)))
+    df[column] = df[column].map(lambda x: mapping.get(x, x))
+    return df
 
 def fix_arabic(text):
     """Reshape Arabic text for proper display."""
     if isinstance(text, str) and any("\u0600" <= c <= "\u06FF" for c in text):
         try:
+            import arabic_reshaper
+            from bidi.algorithm import get_display
             reshaped_text = arabic_reshaper.reshape(text)
             return get_display(reshaped_text)
         except:
@@ -412,6 +514,7 @@ def convert_arabic_numbers(text):
     arabic_nums = str.maketrans('٠١٢٣٤٥٦٧٨٩', '0123456789')
     return text.translate(arabic_nums)
 
+@timed_extractor
 def extract_year(text):
     text = convert_arabic_numbers(text)
     matches = re.findall(r'\b(19[0-9]{2}|20[0-9]{2})\b', text)
@@ -421,6 +524,7 @@ def extract_year(text):
             return match
     return "N/A"
 
+@timed_extractor
 def extract_mileage(text):
     text = convert_arabic_numbers(text)
     patterns = [
@@ -433,24 +537,31 @@ def extract_mileage(text):
             return match.group(0)
     return "غير محدد"
 
+def mileage_bounds(text):
+    """Numeric (low, high) km from a mileage string such as "100,000 - 109,999 كم" or "+200,000 كم"."""
+    if not isinstance(text, str):
+        return None, None
+    numbers = [int(re.sub(r'[,.]', '', n)) for n in re.findall(r'\d+(?:[,.]\d+)*', convert_arabic_numbers(text))]
+    if not numbers:
+        return None, None
+    if len(numbers) >= 2:
+        return numbers[0], numbers[1]
+    if text.strip().startswith('+'):
+        return numbers[0], None
+    return numbers[0], numbers[0]
+
+@timed_extractor
 def extract_condition(text):
-    if re.search(r'(جديد|زيرو|zero|وكالة|new)', text, re.I):
-        return "جديد (زيرو)"
-    elif re.search(r'(مستعمل|used)', text, re.I):
-        return "مستعمل"
-    return "غير محدد"
+    return scan_attributes(text)['condition']
 
+@timed_extractor
 def extract_seller_type(card):
-    try:
-        badge = card.find_element(By.CSS_SELECTOR, "div.memberBadge")
-        badge_text = badge.text
-        if "مستخدم موثق" in badge_text:
-            return "شخصي"
-        elif "نشاط تجاري موثق" in badge_text:
-            return "معرض/وكالة"
-    except:
-        pass
-    text = card.text
+    badge_text = card.get('badge') or ''
+    if "مستخدم موثق" in badge_text:
+        return "شخصي"
+    elif "نشاط تجاري موثق" in badge_text:
+        return "معرض/وكالة"
+    text = card.get('text') or ''
     if re.search(r'(معرض|dealership)', text, re.I):
         return "معرض"
     elif re.search(r'(وكالة|agency)', text, re.I):
@@ -459,67 +570,111 @@ def extract_seller_type(card):
         return "شخصي"
     return "غير محدد"
 
+@timed_extractor
 def extract_json_ld(html):
-    try:
-        pattern = r'<script type="application/ld\+json">(.*?)</script>'
-        scripts = re.findall(pattern, html, re.DOTALL)
-        for script in scripts:
-            try:
-                data = json.loads(script)
-                if isinstance(data, dict) and data.get('@type') == 'Vehicle':
-                    return data
-                elif isinstance(data, list):
-                    for item in data:
-                        if item.get('@type') == 'Vehicle':
-                            return item
-            except:
-                continue
-    except:
-        pass
-    return None
+    return StructuredData(html).json_ld
+
+# -------------------- Detail page snapshot --------------------
+# Subtrees that aren't part of the ad: hidden elements, and the navigation and search-filter
+# menus, whose option lists name every fuel type and colour. A browser's body text leaves
+# them out through CSS; the static parse drops them before reading any text or labels.
+NON_AD_SELECTORS = (
+    "[hidden], [aria-hidden='true'], [style*='display:none' i], [style*='display: none' i], "
+    "[style*='visibility:hidden' i], [style*='visibility: hidden' i], template, "
+    "nav, footer, aside, dialog, [role='dialog'], [role='menu'], [class*='filter' i], [id*='filter' i]"
+)
+
+class DetailPage:
+    """Snapshot of an ad detail page taken once: raw HTML, visible body text and embedded structured data.
+
+    The extract_*_from_page functions read from this object only, so a rendered page costs
+    two WebDriver calls (page_source and body text) no matter how many fields are extracted.
+    The embedded JSON is decoded up front; the HTML is only parsed once a field missing
+    from it needs the DOM.
+    """
+
+    def __init__(self, html, body_text=None, url=None):
+        self.html = html or ''
+        with METRICS.timer('extractor_seconds', extractor='structured_data'):
+            self.structured = StructuredData(self.html, post_id_from_url(url))
+        self.json_ld = self.structured.json_ld
+        if body_text is not None:
+            self.body_text = body_text
+
+    @cached_property
+    def soup(self):
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(self.html, HTML_PARSER)
+        for tag in soup.select(NON_AD_SELECTORS):
+            tag.decompose()
+        return soup
+
+    @cached_property
+    def h1(self):
+        h1 = self.soup.select_one("h1")
+        return h1.get_text(strip=True) if h1 else None
+
+    @cached_property
+    def body_text(self):
+        self.h1  # read before the scripts are stripped from the shared soup
+        # Script and style contents are not part of the visible text
+        for tag in self.soup(['script', 'style', 'noscript', 'template']):
+            tag.decompose()
+        body = self.soup.body or self.soup
+        return body.get_text('\n', strip=True)
+
+    @classmethod
+    def from_driver(cls, driver, url=None):
+        from selenium.webdriver.common.by import By
+        return cls(driver.page_source, driver.find_element(By.TAG_NAME, "body").text, url)
+
+    @cached_property
+    def attributes(self):
+        """Fuel, transmission, insurance, colour, condition and installment markers from one scan of the body text."""
+        with METRICS.timer('extractor_seconds', extractor='scan_attributes'):
+            return scan_attributes(self.body_text)
+
+    def labelled_value(self, label):
+        """Static equivalent of //span[contains(text(), label)]/following-sibling::a."""
+        span = self.soup.find('span', string=lambda s: s is not None and label in s)
+        if span:
+            value = span.find_next_sibling('a')
+            if value:
+                return value.get_text(strip=True)
+        return None
+
+    def select_text(self, selector):
+        elem = self.soup.select_one(selector)
+        return elem.get_text(' ', strip=True) if elem else None
 
 # -------------------- Enhanced model extraction functions --------------------
-def extract_model_from_card_and_page(card, page_html=None, page_driver=None):
-    # 1. JSON-LD
-    if page_html:
-        json_data = extract_json_ld(page_html)
-        if json_data:
-            if 'name' in json_data and json_data['name']:
-                return json_data['name']
-            if 'model' in json_data and json_data['model']:
-                return json_data['model']
+@timed_extractor
+def extract_model_from_page(page):
+    # 1. JSON-LD name or model
+    model = page.structured.get('model')
+    if model:
+        return model
     # 2. h1 from details page
-    if page_driver:
-        try:
-            h1 = page_driver.find_element(By.CSS_SELECTOR, "h1")
-            h1_text = h1.text.strip()
-            if h1_text:
-                return h1_text
-        except:
-            pass
+    return page.h1 or None
+
+@timed_extractor
+def extract_model_from_card(card):
     # 3. h2 on card
-    try:
-        h2 = card.find_element(By.CSS_SELECTOR, "h2.breakWord.trimTwoLines.font-20, h2.breakWord, h2")
-        h2_text = h2.text.strip()
-        if h2_text:
-            return h2_text
-    except:
-        pass
+    title = (card.get('title') or '').strip()
+    if title:
+        return title
     # 4. First line of card text
-    card_text = card.text
+    card_text = card.get('text') or ''
     lines = [line.strip() for line in card_text.split('\n') if line.strip()]
     if lines:
         return lines[0]
     # 5. Fallback to text analysis
     return extract_brand_model_from_text(card_text)
 
+@timed_extractor
 def extract_brand_model_from_text(text):
     text = text.strip()
-    found_brand = None
-    for brand in CAR_BRANDS:
-        if brand in text:
-            found_brand = brand
-            break
+    found_brand = CAR_NAME_MATCHER.find_brand(text)
     if found_brand:
         rest = text.replace(found_brand, '', 1).strip()
         rest = re.sub(r'\b(للبيع|سيارة|بحالة|نظيف|مستعمل|جديد|زيرو|وكالة|معرض|شخصي|فحص|كامل|ممتازة|عداد|قليل|فل|كاش|اقساط|بدون|جمرك|لقطة|مالك|شركه|الوكاله|نظيفة|استخدام)\b', '', rest, flags=re.I)
@@ -533,65 +688,57 @@ def extract_brand_model_from_text(text):
     return cleaned if cleaned else "غير متوفر"
 
 # -------------------- Enhanced fuel type extraction --------------------
-def extract_fuel_type_advanced(driver):
-    json_data = extract_json_ld(driver.page_source)
-    page_text = driver.find_element(By.TAG_NAME, "body").text.lower()
-    if json_data and 'fuelType' in json_data:
-        fuel = json_data['fuelType'].lower()
-        if 'electric' in fuel:
+def fuel_from_label(fuel_text):
+    if fuel_text:
+        if 'كهرباء' in fuel_text:
             return "كهرباء"
-        elif 'hybrid' in fuel:
+        elif 'هايبرد' in fuel_text:
             return "هايبرد"
-        elif 'diesel' in fuel:
+        elif 'ديزل' in fuel_text:
             return "ديزل"
-        elif 'petrol' in fuel or 'gasoline' in fuel:
+        elif 'بنزين' in fuel_text:
             return "بنزين"
-    try:
-        fuel_elem = driver.find_element(By.XPATH, "//span[contains(text(),'نوع الوقود')]/following-sibling::a")
-        fuel_text = fuel_elem.text.strip()
-        if fuel_text:
-            if 'كهرباء' in fuel_text:
-                return "كهرباء"
-            elif 'هايبرد' in fuel_text:
-                return "هايبرد"
-            elif 'ديزل' in fuel_text:
-                return "ديزل"
-            elif 'بنزين' in fuel_text:
-                return "بنزين"
-    except:
-        pass
-    if re.search(r'\b(هايبرد|hybrid)\b', page_text, re.I):
-        return "هايبرد"
-    if re.search(r'\b(ديزل|diesel)\b', page_text, re.I):
-        return "ديزل"
-    if re.search(r'\b(بنزين|petrol|gasoline)\b', page_text, re.I):
-        return "بنزين"
-    if re.search(r'\b(كهرباء|electric|ev)\b', page_text, re.I):
-        return "كهرباء"
-    return "غير محدد"
+    return None
+
+@timed_extractor
+def extract_fuel_type_advanced(page):
+    fuel = page.structured.get('fuel_type')
+    if fuel:
+        return fuel
+    fuel = fuel_from_label(page.labelled_value('نوع الوقود'))
+    if fuel:
+        return fuel
+    return page.attributes['fuel']
 
 # -------------------- Price extraction and advanced installment detection --------------------
+PRICE_SELECTORS = [
+    "div.priceColor.bold.alignSelfCenter.font-18.ms-auto",
+    "span.postCard__price",
+    "div._price",
+    "span.price"
+]
+
 def clean_price_number(price_str):
     if not isinstance(price_str, str) or price_str == "N/A":
-        return np.nan
+        return float('nan')
     match = re.search(r'(\d+[,.]?\d*)', price_str)
     if match:
         try:
             return float(match.group(1).replace(',', ''))
         except:
             pass
-    return np.nan
+    return float('nan')
 
-def is_installment_advanced(price_str, page_text, fuel_type=None, price_num=None):
+@timed_extractor
+def is_installment_advanced(price_str, page_text, fuel_type=None, price_num=None, page_attributes=None):
     if not isinstance(price_str, str):
         return False
 
-    # Explicit installment keywords
-    installment_keywords = ['قسط', 'شهري', 'تقسيط', 'installment', 'monthly', 'دفعة أولى', 'دفعة']
-    combined = price_str + " " + page_text
-    for kw in installment_keywords:
-        if re.search(rf'\b{kw}\b', combined, re.I):
-            return True
+    # Explicit installment keywords (page_attributes: a scan_attributes result already computed for page_text)
+    if page_attributes is None:
+        page_attributes = scan_attributes(page_text)
+    if page_attributes['installment'] or scan_attributes(price_str)['installment']:
+        return True
 
     # Price rules based on fuel type
     if fuel_type is not None and price_num is not None:
@@ -602,353 +749,1252 @@ def is_installment_advanced(price_str, page_text, fuel_type=None, price_num=None
 
     return False
 
-def extract_price_from_page(driver):
-    json_data = extract_json_ld(driver.page_source)
-    page_text = driver.find_element(By.TAG_NAME, "body").text
-    price_text = "N/A"
-    price_num = np.nan
-
-    # 1. JSON-LD
-    if json_data and 'offers' in json_data:
-        offers = json_data['offers']
-        if isinstance(offers, dict) and 'price' in offers:
-            price_val = offers['price']
-            try:
-                if isinstance(price_val, (int, float)):
-                    num = price_val
-                else:
-                    num = float(str(price_val).replace(',', ''))
-                if 1000 <= num <= 200000:
-                    currency = offers.get('priceCurrency', 'دينار')
-                    price_text = f"{price_val} {currency}"
-                    price_num = num
-            except:
-                pass
+def price_from_element_text(text):
+    match = re.search(r'(\d{1,3}(?:,\d{3})*(?:\.\d+)?|\d+)\s*(دينار|JD)?', text)
+    if match:
+        try:
+            num = float(match.group(1).replace(',', ''))
+            if 1000 <= num <= 200000:
+                return text, num
+        except:
+            pass
+    return None
+
+def price_from_text(page_text):
+    patterns = [
+        r'(\d{1,3}(?:,\d{3})*)\s*(دينار|JD)',
+        r'(\d+)\s*(دينار|JD)'
+    ]
+    for pattern in patterns:
+        matches = re.findall(pattern, page_text)
+        for num_str, unit in matches:
+            clean_num = float(num_str.replace(',', ''))
+            if 1000 <= clean_num <= 200000:
+                return f"{num_str} دينار", clean_num
+    return None
+
+@timed_extractor
+def extract_price_from_page(page):
+    # 1. Structured data (JSON-LD offer or page state)
+    price = page.structured.get('price')
 
     # 2. Visible price elements
-    if price_num is np.nan:
-        selectors = [
-            "div.priceColor.bold.alignSelfCenter.font-18.ms-auto",
-            "span.postCard__price",
-            "div._price",
-            "span.price"
-        ]
-        for selector in selectors:
-            try:
-                elem = driver.find_element(By.CSS_SELECTOR, selector)
-                text = elem.text.strip()
-                match = re.search(r'(\d{1,3}(?:,\d{3})*(?:\.\d+)?|\d+)\s*(دينار|JD)?', text)
-                if match:
-                    num_str = match.group(1)
-                    try:
-                        num = float(num_str.replace(',', ''))
-                        if 1000 <= num <= 200000:
-                            price_text = text
-                            price_num = num
-                            break
-                    except:
-                        pass
-            except:
-                continue
+    if price is None:
+        for selector in PRICE_SELECTORS:
+            text = page.select_text(selector)
+            if text:
+                price = price_from_element_text(text)
+                if price:
+                    break
 
     # 3. General page search
-    if price_num is np.nan:
-        patterns = [
-            r'(\d{1,3}(?:,\d{3})*)\s*(دينار|JD)',
-            r'(\d+)\s*(دينار|JD)'
-        ]
-        for pattern in patterns:
-            matches = re.findall(pattern, page_text)
-            for num_str, unit in matches:
-                clean_num = float(num_str.replace(',', ''))
-                if 1000 <= clean_num <= 200000:
-                    price_text = f"{num_str} دينار"
-                    price_num = clean_num
-                    break
-            if price_num is not np.nan:
-                break
+    if price is None:
+        price = price_from_text(page.body_text)
 
-    return price_text, price_num
+    return price if price else ("N/A", float('nan'))
 
 # -------------------- Other helper functions --------------------
-def extract_transmission_from_page(driver):
-    try:
-        page_text = driver.find_element(By.TAG_NAME, "body").text
-        if re.search(r'(اوتوماتيك|automatic|اتوماتيك)', page_text, re.I):
-            return "اوتوماتيك"
-        elif re.search(r'(يدوي|manual|عادي)', page_text, re.I):
-            return "يدوي"
-    except:
-        pass
+@timed_extractor
+def extract_transmission_from_page(page):
+    return page.structured.get('transmission') or page.attributes['transmission'] or page.labelled_value('ناقل الحركة') or "غير محدد"
+
+@timed_extractor
+def extract_color_from_page(page):
+    return page.structured.get('color') or page.labelled_value('اللون') or page.attributes['color'] or "غير محدد"
+
+@timed_extractor
+def extract_insurance_from_page(page):
+    return page.structured.get('insurance') or page.attributes['insurance']
+
+def extract_detail(page):
+    """Extract every detail-page field from a DetailPage snapshot.
+    Fields the page's structured data carries are taken from it; the rest fall back to the DOM and text."""
+    price_text, price_num = extract_price_from_page(page)
+    return {
+        'model': extract_model_from_page(page),
+        'year': page.structured.get('year') or extract_year(page.body_text),
+        'mileage': page.structured.get('mileage'),
+        'condition': page.structured.get('condition'),
+        'price_text': price_text,
+        'price_num': price_num,
+        'fuel_type': extract_fuel_type_advanced(page),
+        'insurance': extract_insurance_from_page(page),
+        'transmission': extract_transmission_from_page(page),
+        'color': extract_color_from_page(page),
+        'page_text': page.body_text,
+        'attributes': page.attributes,
+    }
+
+# -------------------- Readiness waits --------------------
+# Pages are used as soon as the data we read is present instead of after a fixed sleep.
+DETAIL_READY_TIMEOUT = 10
+LISTING_READY_TIMEOUT = 20
+
+class PageLoadTimeout(Exception):
+    """A listing page did not load in the browser in time."""
+
+class ListingFetchFailed(Exception):
+    """A listing page could not be fetched, even after retries."""
+
+def wait_for(driver, stage, condition, timeout):
+    """Wait until condition holds or timeout expires, recording the time spent as
+    stage_seconds{stage=wait_<stage>}. Returns False on timeout instead of raising."""
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, TimeoutException
+    start = time.monotonic()
+    timed_out = False
     try:
-        trans_elem = driver.find_element(By.XPATH, "//span[contains(text(),'ناقل الحركة')]/following-sibling::a")
-        return trans_elem.text.strip()
-    except:
-        pass
-    return "غير محدد"
+        WebDriverWait(driver, timeout, poll_frequency=0.1,
+                      ignored_exceptions=(NoSuchElementException, StaleElementReferenceException)).until(condition)
+    except TimeoutException:
+        timed_out = True
+    elapsed = time.monotonic() - start
+    METRICS.observe('stage_seconds', elapsed, stage=f'wait_{stage}')
+    if timed_out:
+        METRICS.count('errors_total', reason='wait_timeout', stage=stage)
+    return not timed_out
+
+def detail_ready():
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    # JSON-LD or a visible price element means the fields we extract are in the DOM
+    return EC.any_of(
+        EC.presence_of_element_located((By.CSS_SELECTOR, "script[type='application/ld+json']")),
+        EC.presence_of_element_located((By.CSS_SELECTOR, ", ".join(PRICE_SELECTORS))),
+    )
+
+def listing_ready():
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    return EC.presence_of_element_located((By.CSS_SELECTOR, CARD_SELECTOR))
+
+# -------------------- HTTP fetch engine --------------------
+# Most detail pages carry everything we need in the raw HTML (JSON-LD, labelled
+# spec rows, visible price), so they are fetched over a pooled keep-alive session
+# and parsed statically. Chrome is only started for pages the static parse can't fill.
+STATIC_REQUIRED_FIELDS = ('model', 'price_text', 'fuel_type')
+MISSING_VALUES = (None, '', 'N/A', 'غير محدد', 'غير متوفر')
+
+# Every request goes through one rate controller: a token bucket and an adaptive (AIMD)
+# concurrency limit per host, with backoff and retries on 429, 5xx, timeouts and
+# connection errors. Retries are left to it rather than urllib3, so a throttled host
+# also slows down every other thread fetching from it.
+RATE_LIMITER = RateController()
+
+def create_session(pool_size=10):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'User-Agent': USER_AGENT,
+        'Accept-Language': 'ar,en;q=0.8',
+    })
+    return session
+
+def fetch_html(session, url, timeout=15, cache=None):
+    """Return the page HTML, or None if the request fails (after RATE_LIMITER's retries).
+    With an HttpCache, fresh copies are served from it and stale ones revalidated."""
+    def fetch(headers):
+        with METRICS.timer('stage_seconds', stage='http_fetch'):
+            response = RATE_LIMITER.request(session, url, timeout=timeout, headers=headers)
+        METRICS.count('http_requests_total', outcome=str(response.status_code) if response is not None else 'error')
+        return response
+
+    if cache is not None:
+        status, text = cache.get(url, fetch)
+        return text if status == 200 else None
+    response = fetch({})
+    if response is not None and response.status_code == 200:
+        return response.text
+    return None
 
-def extract_color_from_page(driver):
+def page_url(url, page):
+    """Listing URL for a given results page (the site paginates with ?page=N)."""
+    parts = urlparse(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != 'page']
+    if page > 1:
+        query.append(('page', str(page)))
+    return urlunparse(parts._replace(query=urlencode(query)))
+
+# Listing card selectors, shared by the static parser and the in-browser extractor
+CARD_SELECTOR = "a.postListItemData"
+CARD_FIELD_SELECTORS = {
+    'location': "div.flex.alignItems.gap-5.darkGrayColor",
+    'badge': "div.memberBadge",
+    'title': "h2.breakWord.trimTwoLines.font-20, h2.breakWord, h2",
+}
+NEXT_PAGE_SELECTOR = "a[data-id='nextPageArrow']"
+LAST_PAGE_SELECTOR = "a[data-id='lastPageArrow']"
+
+def total_pages_from_href(href):
+    match = re.search(r'page=(\d+)', href or '')
+    return int(match.group(1)) if match else 1
+
+def card_from_tag(tag, base_url):
+    href = tag.get('href')
+    card = {
+        'href': urljoin(base_url, href) if href else None,
+        'text': tag.get_text('\n', strip=True),
+    }
+    for field, selector in CARD_FIELD_SELECTORS.items():
+        child = tag.select_one(selector)
+        card[field] = child.get_text(strip=True) if child else None
+    return card
+
+@timed_extractor
+def parse_listing_html(html, base_url):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, HTML_PARSER)
+    cards = [card_from_tag(tag, base_url) for tag in soup.select(CARD_SELECTOR)]
+    next_link = soup.select_one(NEXT_PAGE_SELECTOR)
+    last_link = soup.select_one(LAST_PAGE_SELECTOR)
+    return {
+        'cards': cards,
+        'next_url': urljoin(base_url, next_link['href']) if next_link and next_link.get('href') else None,
+        'total_pages': total_pages_from_href(last_link.get('href')) if last_link else 1,
+    }
+
+def parse_detail_html(html, url=None):
+    """Extract the detail-page fields from raw HTML without a browser (url identifies the ad's own record)."""
+    with METRICS.timer('stage_seconds', stage='detail_parse'):
+        return extract_detail(DetailPage(html, url=url))
+
+def fetch_detail_http(session, url):
+    html = fetch_html(session, url, cache=get_http_cache())
+    if html is None:
+        return None
+    return parse_detail_html(html, url)
+
+def fetch_detail_selenium(driver, url):
+    """Render the detail page in a new tab and extract the same fields as parse_detail_html."""
+    start = time.perf_counter()
+    driver.switch_to.new_window('tab')
     try:
-        color_elem = driver.find_element(By.XPATH, "//span[contains(text(),'اللون')]/following-sibling::a")
-        return color_elem.text.strip()
-    except:
-        try:
-            page_text = driver.find_element(By.TAG_NAME, "body").text
-            colors = ['أبيض', 'أسود', 'رمادي', 'فضي', 'أزرق', 'أحمر', 'أخضر', 'بني', 'بيج', 'ذهبي', 'أزرق فاتح']
-            for c in colors:
-                if c in page_text:
-                    return c
-        except:
-            pass
-    return "غير محدد"
+        if LEAN_BROWSER:
+            # Blocked URLs are set per tab, so before the page starts loading
+            block_resources(driver)
+        driver.get(url)
+        # A page without either marker is still snapshotted once the timeout expires
+        wait_for(driver, 'detail', detail_ready(), DETAIL_READY_TIMEOUT)
+        page = DetailPage.from_driver(driver, url)
+    finally:
+        if len(driver.window_handles) > 1:
+            driver.close()
+        driver.switch_to.window(driver.window_handles[0])
+    METRICS.observe('stage_seconds', time.perf_counter() - start, stage='detail_render')
+    with METRICS.timer('stage_seconds', stage='detail_parse'):
+        return extract_detail(page)
+
+def detail_is_complete(detail):
+    return detail is not None and all(detail.get(f) not in MISSING_VALUES for f in STATIC_REQUIRED_FIELDS)
+
+# Reads every card of a rendered listing page in one WebDriver round trip, into the same
+# dict shape as card_from_tag (innerText is what WebElement.text returns), plus the
+# pagination links. Arguments: card selector, {field: child selector}, next and last link selectors.
+LISTING_SCRIPT = """
+const [cardSelector, fieldSelectors, nextSelector, lastSelector] = arguments;
+const link = el => (el && el.getAttribute('href')) ? el.href : null;
+const cards = Array.from(document.querySelectorAll(cardSelector), card => {
+    const data = {href: link(card), text: card.innerText};
+    for (const [field, selector] of Object.entries(fieldSelectors)) {
+        const child = card.querySelector(selector);
+        data[field] = child ? child.innerText.trim() : null;
+    }
+    return data;
+});
+return {
+    cards: cards,
+    next_url: link(document.querySelector(nextSelector)),
+    last_url: link(document.querySelector(lastSelector)),
+};
+"""
+
+def fetch_listing_http(session, url, base_url):
+    """Fetch and parse one listing page; None if the request fails."""
+    html = fetch_html(session, url)
+    if html is None:
+        return None
+    return parse_listing_html(html, base_url)
+
+def fetch_listing_selenium(driver, url):
+    """Load one listing page by URL in the browser and read it like parse_listing_html."""
+    from selenium.common.exceptions import TimeoutException
+    try:
+        driver.get(url)
+    except TimeoutException:
+        raise PageLoadTimeout(url)
+    if not wait_for(driver, 'listing', listing_ready(), LISTING_READY_TIMEOUT):
+        raise PageLoadTimeout("Search results did not load")
+    with METRICS.timer('stage_seconds', stage='listing_extract'):
+        page = driver.execute_script(LISTING_SCRIPT, CARD_SELECTOR, CARD_FIELD_SELECTORS,
+                                     NEXT_PAGE_SELECTOR, LAST_PAGE_SELECTOR)
+    return {'cards': page['cards'], 'next_url': page['next_url'], 'total_pages': total_pages_from_href(page['last_url'])}
+
+# -------------------- Listing page scheduler --------------------
+# Listing pages are addressed directly as search_url + page=N, so they don't have to be
+# reached by clicking through the previous ones and can be fetched ahead of the crawl.
+LISTING_CONCURRENCY = 4     # listing pages fetched ahead of the one being processed
+
+class PageScheduler:
+    """Fetches listing pages by URL, several at once and in any order, and hands them out in page order.
+
+    Handing pages out in order keeps the journal's page checkpoints meaningful for --resume.
+    New ads pushed onto the first page while the crawl runs shift older ones onto later
+    pages; those repeats are dropped by post ID.
+    """
+
+    def __init__(self, fetch, search_url, concurrency=LISTING_CONCURRENCY):
+        self.fetch = fetch
+        self.search_url = search_url
+        self.concurrency = concurrency
+        self.seen_post_ids = set()
 
-def extract_insurance_from_page(driver):
+    def fetch_page(self, page):
+        return self.fetch(page_url(self.search_url, page))
+
+    def dedupe(self, listing):
+        cards = []
+        for card in listing['cards']:
+            post_id = post_id_from_url(card['href'])
+            if post_id in self.seen_post_ids:
+                continue
+            self.seen_post_ids.add(post_id)
+            cards.append(card)
+        return {**listing, 'cards': cards, 'duplicates': len(listing['cards']) - len(cards)}
+
+    def iter_pages(self, start_page, first_listing, last_page=None):
+        """Yield (page, listing) from start_page, whose listing has already been fetched,
+        until a page is empty or the last page (or last_page) is passed.
+        Raises ListingFetchFailed for a page that can't be loaded, so the run stays resumable."""
+        pool = ThreadPoolExecutor(max_workers=self.concurrency) if self.concurrency > 1 else None
+        pending = {}
+        next_to_submit = start_page + 1
+        page, listing = start_page, first_listing
+        total_pages = 0
+        try:
+            while True:
+                if listing is None:
+                    raise ListingFetchFailed(page_url(self.search_url, page))
+                if not listing['cards']:
+                    return
+                total_pages = max(total_pages, listing['total_pages'])
+                if listing.get('next_url') and total_pages <= page:
+                    # No page count on this page, but there is a next one
+                    total_pages = page + 1
+                if last_page:
+                    total_pages = min(total_pages, last_page)
+                while pool and next_to_submit <= total_pages and len(pending) < self.concurrency:
+                    pending[next_to_submit] = pool.submit(self.fetch_page, next_to_submit)
+                    next_to_submit += 1
+
+                yield page, self.dedupe(listing)
+
+                page += 1
+                if page > total_pages:
+                    return
+                listing = pending.pop(page).result() if page in pending else None
+                if listing is None:
+                    # Not prefetched, or the prefetch failed: fetch it now
+                    listing = self.fetch_page(page)
+        finally:
+            if pool:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+# -------------------- Concurrent detail fetching --------------------
+DETAIL_CONCURRENCY = 16     # worker threads; RATE_LIMITER decides how many of them a host gets at once
+
+def fetch_details_concurrently(pool, session, urls):
+    """Fetch and statically parse detail pages in parallel. Results keep the order of urls;
+    failed fetches come back as None so the caller can fall back to the browser."""
+    def fetch(url):
+        try:
+            return fetch_detail_http(session, url)
+        except Exception:
+            METRICS.count('errors_total', reason='fetch')
+            return None
+    return list(pool.map(fetch, urls))
+
+# -------------------- Chrome worker pool --------------------
+CHROME_WORKERS = 4          # headless Chrome processes for pages that need a browser
+CHROME_STALL_TIMEOUT = 180  # seconds without any worker progress before pending pages are given up
+CHROME_RATE = 2.0           # page loads per second per host for all workers together
+
+def chrome_worker(worker_id, task_queue, result_queue, rate=CHROME_RATE / CHROME_WORKERS):
+    """Worker process: owns one headless Chrome and renders detail pages from the shared queue.
+
+    Processes can't share RATE_LIMITER, so each worker paces its page loads with its own
+    controller at its share of CHROME_RATE, and backs off after a failed render.
+    """
+    limiter = RateController(max_retries=0, rate=rate, burst=1, concurrency=1, max_concurrency=1)
+    driver = None
     try:
-        page_text = driver.find_element(By.TAG_NAME, "body").text
-        if re.search(r'تأمين شامل', page_text, re.I):
-            return "تأمين شامل"
-        elif re.search(r'تأمين إلزامي', page_text, re.I):
-            return "تأمين إلزامي"
-        elif re.search(r'(تأمين|مؤمنة|مرخصة)', page_text, re.I):
-            return "يوجد تأمين"
-    except:
-        pass
-    return "لا يوجد تأمين"
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            task_id, url = task
+            result_queue.put(('start', worker_id, task_id, None))
+            try:
+                if driver is None:
+                    driver = setup_driver(headless=True)
+                with limiter.slot(url):
+                    detail = fetch_detail_selenium(driver, url)
+                result_queue.put(('done', worker_id, task_id, detail))
+            except Exception as e:
+                result_queue.put(('error', worker_id, task_id, str(e)))
+                # A broken session is replaced on the next task
+                try:
+                    driver.quit()
+                except:
+                    pass
+                driver = None
+    finally:
+        if driver is not None:
+            try:
+                driver.quit()
+            except:
+                pass
+        result_queue.put(('stats', worker_id, None, METRICS.snapshot()))
+
+class ChromeWorkerPool:
+    """Pool of headless Chrome worker processes pulling detail URLs from a shared queue.
+
+    Each worker owns its own driver, so a crashed browser or worker only loses the page it
+    was rendering; the dead worker is replaced and the rest of the run carries on.
+    """
+
+    def __init__(self, workers=CHROME_WORKERS, stall_timeout=CHROME_STALL_TIMEOUT):
+        self.workers = workers
+        self.stall_timeout = stall_timeout
+        self._ctx = multiprocessing.get_context('spawn')
+        self._tasks = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._procs = {}
+        self._in_flight = {}
+        self._next_task_id = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        for worker_id in range(self.workers):
+            self._spawn(worker_id)
+
+    def _spawn(self, worker_id):
+        proc = self._ctx.Process(target=chrome_worker, args=(worker_id, self._tasks, self._results, CHROME_RATE / self.workers), daemon=True)
+        proc.start()
+        self._procs[worker_id] = proc
+
+    def _reap(self, pending):
+        """Replace dead workers and give up on the page each one was rendering."""
+        for worker_id, proc in list(self._procs.items()):
+            if proc.is_alive():
+                continue
+            task_id = self._in_flight.pop(worker_id, None)
+            if task_id in pending:
+                pending.pop(task_id)
+                METRICS.count('errors_total', reason='worker_died')
+                print(fix_arabic(f"⚠️ Chrome worker {worker_id} died (exit code {proc.exitcode}), skipping its page."))
+            self._spawn(worker_id)
+
+    def map(self, urls):
+        """Render detail URLs and return their detail dicts in the same order (None on failure)."""
+        results = [None] * len(urls)
+        pending = {}
+        for index, url in enumerate(urls):
+            task_id = self._next_task_id
+            self._next_task_id += 1
+            pending[task_id] = index
+            self._tasks.put((task_id, url))
+
+        last_progress = time.monotonic()
+        while pending:
+            try:
+                kind, worker_id, task_id, payload = self._results.get(timeout=1)
+            except queue.Empty:
+                self._reap(pending)
+                if time.monotonic() - last_progress > self.stall_timeout:
+                    METRICS.count('errors_total', len(pending), reason='render_stalled')
+                    print(fix_arabic(f"⚠️ Chrome workers stalled, giving up on {len(pending)} pages."))
+                    break
+                continue
+            last_progress = time.monotonic()
+            if kind == 'stats':
+                METRICS.merge(payload)
+                continue
+            if kind == 'start':
+                self._in_flight[worker_id] = task_id
+                continue
+            self._in_flight.pop(worker_id, None)
+            if task_id not in pending:
+                continue
+            index = pending.pop(task_id)
+            if kind == 'done':
+                results[index] = payload
+            else:
+                METRICS.count('errors_total', reason='render')
+                print(fix_arabic(f"⚠️ Error rendering {urls[index]}: {payload}"))
+        return results
+
+    def close(self, timeout=10):
+        for _ in self._procs:
+            self._tasks.put(None)
+        deadline = time.monotonic() + timeout
+        # Each worker reports its wait statistics on the way out
+        reported = 0
+        while reported < len(self._procs) and time.monotonic() < deadline:
+            try:
+                kind, _, _, payload = self._results.get(timeout=max(0.1, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if kind == 'stats':
+                METRICS.merge(payload)
+                reported += 1
+        for proc in self._procs.values():
+            proc.join(max(0, deadline - time.monotonic()))
+            if proc.is_alive():
+                proc.terminate()
+        self._procs.clear()
 
 # -------------------- Browser setup --------------------
-def setup_driver():
+# webdriver_manager asks the network for the driver matching the installed Chrome on every
+# call, so the resolved path is kept in CHROMEDRIVER_CACHE and only looked up again when it
+# is gone, older than CHROMEDRIVER_CACHE_MAX_AGE, or Chrome refuses to start with it.
+# CHROMEDRIVER_PATH in the environment points at a driver directly.
+CHROMEDRIVER_CACHE = "chromedriver_path.txt"
+CHROMEDRIVER_CACHE_MAX_AGE = 7 * 24 * 3600
+
+def chromedriver_path(refresh=False):
+    """Path of the chromedriver binary: from the environment, the on-disk cache, or webdriver_manager."""
+    path = os.environ.get('CHROMEDRIVER_PATH')
+    if path:
+        return path
+    if not refresh:
+        try:
+            if time.time() - os.path.getmtime(CHROMEDRIVER_CACHE) < CHROMEDRIVER_CACHE_MAX_AGE:
+                with open(CHROMEDRIVER_CACHE, encoding='utf-8') as f:
+                    path = f.read().strip()
+                if os.access(path, os.X_OK):
+                    return path
+        except OSError:
+            pass
+    from webdriver_manager.chrome import ChromeDriverManager
+    path = ChromeDriverManager().install()
+    # Written under a temporary name so Chrome workers starting at the same time never read half a path
+    temp_path = f"{CHROMEDRIVER_CACHE}.{os.getpid()}"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(path)
+    os.replace(temp_path, CHROMEDRIVER_CACHE)
+    return path
+
+def count_webdriver_calls(driver):
+    """Count every WebDriver command the driver sends (element lookups and waits included)."""
+    execute = driver.execute
+    def counted(driver_command, params=None):
+        METRICS.count('webdriver_calls_total', command=driver_command)
+        return execute(driver_command, params)
+    # WebElements send their commands through their parent driver, so they are counted too
+    driver.execute = counted
+    return driver
+
+# Lean browser profile: the extractors only read the DOM, so images, media, fonts, stylesheets
+# and ad/analytics scripts are blocked by URL pattern (Network.setBlockedURLs wildcards).
+# ALLOWED_URL_PATTERNS (URLPattern syntax) are matched first and never blocked; the site's
+# own stylesheets stay, because element .text only returns what CSS leaves visible and
+# hidden filter menus would otherwise leak fuel and colour names into the body text.
+LEAN_BROWSER = True
+BLOCKED_URL_PATTERNS = [
+    # Images and media
+    "*.jpg*", "*.jpeg*", "*.png*", "*.gif*", "*.webp*", "*.avif*", "*.svg*", "*.ico*", "*.mp4*", "*.webm*",
+    # Fonts and stylesheets
+    "*.woff*", "*.ttf*", "*.otf*", "*.eot*", "*.css*",
+    # Ads, analytics and tracking
+    "*googletagmanager.com*", "*google-analytics.com*", "*doubleclick.net*", "*googlesyndication.com*",
+    "*googleadservices.com*", "*facebook.net*", "*connect.facebook.com*", "*hotjar.com*", "*clarity.ms*",
+    "*analytics.tiktok.com*", "*sc-static.net*", "*criteo.*", "*taboola.com*", "*onesignal.com*",
+]
+ALLOWED_URL_PATTERNS = [
+    "*://*.opensooq.com/*.css",
+]
+
+def block_resources(driver, blocked=BLOCKED_URL_PATTERNS, allowed=ALLOWED_URL_PATTERNS):
+    """Stop the browser from downloading resources the extractors never read."""
+    driver.execute_cdp_cmd('Network.enable', {})
+    # Chrome versions without urlPatterns ignore the allowlist and apply the wildcards only
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {
+        'urls': list(blocked),
+        'urlPatterns': [{'urlPattern': pattern, 'block': False} for pattern in allowed],
+    })
+
+def setup_driver(headless=False):
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.common.exceptions import SessionNotCreatedException
     options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument("--headless=new")
+    if LEAN_BROWSER:
+        # Return from driver.get at DOMContentLoaded; wait_for covers what the extractors need
+        options.page_load_strategy = 'eager'
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
     options.add_argument("--disable-blink-features=AutomationControlled")
     options.add_experimental_option("excludeSwitches", ["enable-automation"])
     options.add_experimental_option('useAutomationExtension', False)
-    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+    options.add_argument(f"user-agent={USER_AGENT}")
+    try:
+        driver = webdriver.Chrome(service=Service(chromedriver_path()), options=options)
+    except SessionNotCreatedException:
+        # Chrome was updated past the cached driver version
+        driver = webdriver.Chrome(service=Service(chromedriver_path(refresh=True)), options=options)
+    count_webdriver_calls(driver)
+    if LEAN_BROWSER:
+        try:
+            block_resources(driver)
+        except Exception as e:
+            print(fix_arabic(f"⚠️ Could not block page resources: {e}"))
     driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
     return driver
 
+# -------------------- Row assembly --------------------
+@METRICS.timed('stage_seconds', stage='build_row')
+def build_ad_row(card, detail):
+    """Combine card-level and detail-page fields into an output row (without ID).
+    Returns None for installment ads."""
+    card_text = card['text'] or ''
+    year = extract_year(card_text)
+    if year == "N/A":
+        year = detail['year']
+
+    if is_installment_advanced(detail['price_text'], detail['page_text'], detail['fuel_type'],
+                               detail['price_num'], detail['attributes']):
+        return None
+
+    model = detail['model'] or extract_model_from_card(card)
+    if model == "غير متوفر" or not model:
+        model = extract_brand_model_from_text(card_text)
+
+    return {
+        'Model': model,
+        'Year': year,
+        'Condition': detail.get('condition') or extract_condition(card_text),
+        'Fuel Type': detail['fuel_type'],
+        'Mileage': detail.get('mileage') or extract_mileage(card_text),
+        'Seller Type': extract_seller_type(card),
+        'Location': card['location'] or "غير محدد",
+        'Price': detail['price_text'],
+        'Insurance': detail['insurance'],
+        'Transmission': detail['transmission'],
+        'Color': detail['color']
+    }
+
+# -------------------- Repost detection --------------------
+# Dealers repost the same car under new post IDs. A card whose content key belongs to an ad
+# written under another post ID is skipped before its detail page is fetched. A key is only
+# claimed once its ad's row has been written, so a failed fetch or an installment ad doesn't
+# hide the car's other listings. Keys from earlier runs (within REPOST_WINDOW_DAYS) only
+# count in incremental mode; a full snapshot dedupes within the run. Mileage is compared
+# in buckets because reposts round it differently; cards without a known brand, model,
+# year or mileage get no key and are never treated as reposts.
+REPOST_MILEAGE_BUCKET = 10000
+
+def repost_key(card):
+    """Content key of a listing card (see seen_index.content_key), or None if it is too sparse."""
+    text = card['text'] or ''
+    name = split_car_model(extract_model_from_card(card))
+    low, _ = mileage_bounds(extract_mileage(text))
+    price = price_from_text(convert_arabic_numbers(text))
+    year = extract_year(text)
+    return content_key([
+        name['brand'],
+        name['model'],
+        year if year != "N/A" else None,
+        low // REPOST_MILEAGE_BUCKET if low is not None else None,
+        card['location'],
+        extract_seller_type(card),
+        price[1] if price else None,
+    ])
+
+def should_skip_repost(repost_index, journal, page, full_link, key):
+    """True (and the skip recorded) if key belongs to another ad already written as a row; a None key never is.
+
+    Checked before the detail fetch and again before the row is written, since an earlier
+    ad of the same batch may claim the key in between; keys are only claimed once a row is out.
+    """
+    original = repost_index.original(key, post_id_from_url(full_link)) if key else None
+    if not original:
+        return False
+    print(fix_arabic(f"⏭️ Skipping repost of ad {original}: {full_link}"))
+    journal.record_skip(page, full_link, 'repost')
+    METRICS.count('skips_total', reason='repost')
+    return True
+
+# -------------------- Crawl resources --------------------
+class CrawlResources:
+    """HTTP session, detail thread pool and lazily started browsers shared by one crawl."""
+
+    def __init__(self):
+        self.session = create_session(pool_size=DETAIL_CONCURRENCY)
+        self.detail_pool = ThreadPoolExecutor(max_workers=DETAIL_CONCURRENCY)
+        self.driver = None
+        self.chrome_pool = None
+
+    def get_driver(self):
+        # Chrome is only started once a page actually needs it
+        if self.driver is None:
+            print(fix_arabic("🌐 Starting Chrome for the search listing..."))
+            self.driver = setup_driver(headless=True)
+        return self.driver
+
+    def render_details(self, urls):
+        # Worker processes are only spawned once a detail page actually needs a browser
+        if self.chrome_pool is None:
+            print(fix_arabic(f"🌐 Starting {CHROME_WORKERS} Chrome workers for pages that need a browser..."))
+            self.chrome_pool = ChromeWorkerPool(CHROME_WORKERS)
+            self.chrome_pool.start()
+        return self.chrome_pool.map(urls)
+
+    def open_listing(self, url, base_url):
+        """Fetch the first listing page over HTTP, falling back to the browser.
+        Returns (first listing or None, fetch function for further pages, listing concurrency)."""
+        fetch_listing = lambda page_link: fetch_listing_http(self.session, page_link, base_url)
+        first_page = fetch_listing(url)
+        if first_page and first_page['cards']:
+            return first_page, fetch_listing, LISTING_CONCURRENCY
+        print(fix_arabic("⚠️ Static listing unavailable, falling back to the browser."))
+        # One browser loads one page at a time; a page that times out is retried after a backoff
+        fetch_listing = lambda page_link: RATE_LIMITER.call(
+            page_link, lambda: fetch_listing_selenium(self.get_driver(), page_link),
+            retry_on=(PageLoadTimeout,), timeout_on=(PageLoadTimeout,))
+        try:
+            return fetch_listing(url), fetch_listing, 1
+        except Exception as e:
+            print(fix_arabic(f"⚠️ Could not load search page: {e}"))
+            return None, fetch_listing, 1
+
+    def fetch_details(self, links):
+        """Detail dicts for links, in order (None where unavailable): static HTTP first,
+        then the Chrome workers for pages the static parse couldn't fill."""
+        details = fetch_details_concurrently(self.detail_pool, self.session, links)
+        missing = [i for i, detail in enumerate(details) if not detail_is_complete(detail)]
+        METRICS.count('details_total', len(links) - len(missing), source='http')
+        if missing:
+            METRICS.count('details_total', len(missing), source='browser')
+            rendered = self.render_details([links[i] for i in missing])
+            for i, detail in zip(missing, rendered):
+                details[i] = detail
+        return details
+
+    def close(self):
+        self.detail_pool.shutdown()
+        if self.chrome_pool is not None:
+            self.chrome_pool.close()
+        if self.driver is not None:
+            self.driver.quit()
+        self.session.close()
+
+# -------------------- Output files --------------------
+def open_outputs():
+    """Streaming writers for the Arabic workbook, the Kaggle CSV and the typed Parquet file."""
+    from writers import StreamingOutput, ArabicExcelWriter, EnglishOutputs, EnglishCsvWriter, TypedParquetWriter
+    from normalize import normalize_frame
+    kaggle_writer = EnglishCsvWriter(KAGGLE_OUTPUT)
+    output = StreamingOutput([
+        ArabicExcelWriter(ARABIC_OUTPUT),
+        EnglishOutputs(translate_frame, [kaggle_writer, TypedParquetWriter(PARQUET_OUTPUT, normalize_frame)]),
+    ], chunk_size=OUTPUT_CHUNK_SIZE)
+    return output, kaggle_writer
+
+def close_outputs(output, kaggle_writer):
+    """Flush the last chunk, finalize the files and print the summary."""
+    output.close()
+    if output.rows_written:
+        print(fix_arabic(f"\n✅ Saved Arabic version: {ARABIC_OUTPUT}"))
+        print(fix_arabic(f"✅ Saved Kaggle version: {KAGGLE_OUTPUT}"))
+        print(fix_arabic(f"✅ Saved typed Parquet version: {PARQUET_OUTPUT}"))
+        print(fix_arabic(f"🗂️ Translation cache: {get_translation_cache().summary()}"))
+
+        # Quick statistics
+        print(fix_arabic("\n📊 Data statistics:"))
+        print(f"Total ads: {kaggle_writer.rows_written}")
+        print(f"Electric cars: {kaggle_writer.fuel_counts.get('Electric', 0)}")
+        print(f"Hybrid cars: {kaggle_writer.fuel_counts.get('Hybrid', 0)}")
+        print(f"Petrol cars: {kaggle_writer.fuel_counts.get('Petrol', 0)}")
+        print(f"Diesel cars: {kaggle_writer.fuel_counts.get('Diesel', 0)}")
+
+        # Show sample
+        print(fix_arabic("\n📋 Sample of final data (first 5 rows):"))
+        print(kaggle_writer.sample)
+
+    else:
+        print(fix_arabic("No data found."))
+
 # -------------------- Main program --------------------
-def main():
-    driver = setup_driver()
-    base_url = "https://jo.opensooq.com"
-    search_url = urljoin(base_url, "/ar/سيارات-ومركبات/سيارات-للبيع?search=true&Post_type=7511&Payment_Method=7513&CarCustoms=12565&has_price=1")
+BASE_URL = "https://jo.opensooq.com"
+SEARCH_URL = urljoin(BASE_URL, "/ar/سيارات-ومركبات/سيارات-للبيع?search=true&Post_type=7511&Payment_Method=7513&CarCustoms=12565&has_price=1")
+# Incremental crawls skip ads whose listing card is unchanged since an earlier run (--incremental)
+INCREMENTAL = False
+SEEN_INDEX_PATH = DEFAULT_INDEX_PATH
+SEEN_STOP_AFTER = 50   # consecutive already-seen ads before stopping (newest-first listings); 0 = never
+# Skip reposts of an already-scraped car under a new post ID (index kept in SEEN_INDEX_PATH; --no-repost-dedup)
+REPOST_DEDUP = True
+# Every finished ad and page is journaled so an interrupted run can be resumed with --resume
+JOURNAL_PATH = DEFAULT_JOURNAL_PATH
+# Outputs are streamed in chunks of OUTPUT_CHUNK_SIZE rows, so memory stays flat on long runs
+ARABIC_OUTPUT = "cars_arabic.xlsx"
+KAGGLE_OUTPUT = "jordan_cars_kaggle.csv"
+PARQUET_OUTPUT = "jordan_cars.parquet"
+OUTPUT_CHUNK_SIZE = 500
+
+# End-of-run instrumentation report (stage/extractor latencies, WebDriver calls, skips, errors)
+METRICS_JSON = "run_metrics.json"
+METRICS_PROMETHEUS = "run_metrics.prom"
+
+# Limits for unattended runs (cron, containers): --max-ads/--max-pages or these variables.
+# Without either, an interactive terminal is asked for the number of ads and anything else
+# scrapes everything.
+MAX_ADS_ENV = "SCRAPER_MAX_ADS"
+MAX_PAGES_ENV = "SCRAPER_MAX_PAGES"
+
+def parse_limit(text):
+    """A positive number of ads or pages, or 'all' for no limit."""
+    text = str(text).strip().lower()
+    if text == 'all':
+        return float('inf')
+    value = int(text)
+    if value < 1:
+        raise ValueError(f"limit must be a positive number or 'all', got {text}")
+    return value
+
+def parse_shard_by(text):
+    """(parameter, [values]) from 'PARAM=V1,V2,...', the --shard-by format."""
+    param, sep, values = str(text).partition('=')
+    values = [v.strip() for v in values.split(',') if v.strip()]
+    if not sep or not param.strip() or not values:
+        raise ValueError(f"expected PARAM=V1,V2,..., got {text}")
+    return param.strip(), values
+
+def limit_from_env(name):
+    value = os.environ.get(name)
+    if not value:
+        return None
+    try:
+        return parse_limit(value)
+    except ValueError:
+        sys.exit(f"Invalid {name}={value!r}: expected a positive number or 'all'.")
+
+def ask_max_ads():
+    print(fix_arabic("\n🔢 How many ads do you want to scrape? (Enter a number or 'all' to scrape all): "))
+    user_input = input().strip().lower()
+    if user_input == 'all':
+        return float('inf')
+    try:
+        return int(user_input)
+    except:
+        print(fix_arabic("❌ Invalid input, scraping only 10 ads."))
+        return 10
+
+def main(resume=False, max_ads=None, max_pages=None, incremental=INCREMENTAL, repost_dedup=REPOST_DEDUP):
+    run_start = time.monotonic()
+    resources = CrawlResources()
+    base_url = BASE_URL
+    search_url = SEARCH_URL
+
+    resume_state = RunJournal.load(JOURNAL_PATH) if resume else None
+    if resume and (resume_state is None or resume_state['finished']):
+        print(fix_arabic("ℹ️ No interrupted run to resume, starting a new one."))
+        resume_state = None
+    start_page = resume_state['last_page'] + 1 if resume_state else 1
+    start_url = page_url(search_url, start_page)
+    if resume_state:
+        print(fix_arabic(f"♻️ Resuming from page {start_page} with {resume_state['rows_count']} ads already scraped."))
 
     print(fix_arabic("🔗 Loading search page..."))
-    driver.get(search_url)
-    wait = WebDriverWait(driver, 20)
+    first_page, fetch_listing, listing_concurrency = resources.open_listing(start_url, base_url)
 
     # Initial statistics
-    try:
-        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "a.postListItemData")))
-        first_page_count = len(driver.find_elements(By.CSS_SELECTOR, "a.postListItemData"))
-        try:
-            last_page_link = driver.find_element(By.CSS_SELECTOR, "a[data-id='lastPageArrow']")
-            last_page_href = last_page_link.get_attribute("href")
-            match = re.search(r'page=(\d+)', last_page_href)
-            total_pages = int(match.group(1)) if match else 1
-        except:
-            total_pages = 1
+    if first_page:
+        first_page_count = len(first_page['cards'])
+        total_pages = first_page['total_pages']
         total_ads_estimate = first_page_count * total_pages
         print(fix_arabic(f"\n📊 Search statistics:"))
         print(fix_arabic(f"   - Ads on first page: {first_page_count}"))
         print(fix_arabic(f"   - Available pages: {total_pages}"))
         print(fix_arabic(f"   - Estimated total: ~{total_ads_estimate} ads"))
-    except Exception as e:
-        print(fix_arabic(f"⚠️ Could not calculate statistics: {e}"))
+    else:
+        print(fix_arabic("⚠️ Could not calculate statistics."))
 
     # Choose number of ads
-    print(fix_arabic("\n🔢 How many ads do you want to scrape? (Enter a number or 'all' to scrape all): "))
-    user_input = input().strip().lower()
-    if user_input == 'all':
-        max_ads = float('inf')
+    if resume_state:
+        saved_max = resume_state['settings'].get('max_ads')
+        max_ads = float('inf') if saved_max is None else saved_max
+        max_pages = resume_state['settings'].get('max_pages')
+        incremental = resume_state['settings'].get('incremental', incremental)
+        repost_dedup = resume_state['settings'].get('repost_dedup', repost_dedup)
+    elif max_ads is None:
+        max_ads = ask_max_ads() if sys.stdin.isatty() else float('inf')
+    max_pages = max_pages or float('inf')
+    print(fix_arabic(f"🔢 Limits: {'all' if max_ads == float('inf') else max_ads} ads, "
+                     f"{'all' if max_pages == float('inf') else max_pages} pages."))
+
+    # Rows are written to the outputs in chunks as they are scraped
+    output, kaggle_writer = open_outputs()
+
+    journal = RunJournal(JOURNAL_PATH)
+    if resume_state:
+        # The outputs are rewritten, starting with the ads finished before the interruption
+        for row in RunJournal.iter_rows(JOURNAL_PATH):
+            output.add(row)
+        journal.reopen()
+        ad_counter = resume_state['ad_counter']
+        done_urls = resume_state['done_urls']
     else:
-        try:
-            max_ads = int(user_input)
-        except:
-            print(fix_arabic("❌ Invalid input, scraping only 10 ads."))
-            max_ads = 10
-
-    all_ads = []
-    ad_counter = 1
-    current_page = 1
+        journal.start(search_url=search_url, max_ads=None if max_ads == float('inf') else max_ads,
+                      max_pages=None if max_pages == float('inf') else max_pages,
+                      incremental=incremental, repost_dedup=repost_dedup)
+        ad_counter = 1
+        done_urls = set()
+    current_page = start_page
+    resume_page = start_page   # first page not finished yet
     stop_flag = False
+    interrupted = False
+    seen_index = SeenIndex(SEEN_INDEX_PATH) if incremental else None
+    seen_run = 0
+    skipped_seen = 0
+    seen_limit_reached = False
+    repost_index = RepostIndex(SEEN_INDEX_PATH, cross_run=incremental, since=resume_state['started'] if resume_state else None,
+                               seen_index=seen_index) if repost_dedup else None
+    skipped_reposts = 0
+    scheduler = PageScheduler(fetch_listing, search_url, listing_concurrency)
+    pages = scheduler.iter_pages(start_page, first_page, None if max_pages == float('inf') else max_pages)
 
     while not stop_flag:
-        print(fix_arabic(f"\n📄 Scraping page {current_page}..."))
         try:
-            wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "a.postListItemData")))
-            time.sleep(2)
-            ad_cards = driver.find_elements(By.CSS_SELECTOR, "a.postListItemData")
+            with METRICS.timer('stage_seconds', stage='listing_page'):
+                scheduled = next(pages, None)
+            if scheduled is None:
+                print(fix_arabic("No more pages."))
+                break
+            current_page, listing = scheduled
+            print(fix_arabic(f"\n📄 Scraping page {current_page}..."))
+            ad_cards = [card for card in listing['cards'] if card['href']]
             print(fix_arabic(f"   Found {len(ad_cards)} ads on this page."))
-
-            for card in ad_cards:
+            if listing['duplicates']:
+                # The listing shifted since an earlier page was fetched
+                print(fix_arabic(f"   Skipped {listing['duplicates']} ads already seen on earlier pages."))
+                METRICS.count('skips_total', listing['duplicates'], reason='duplicate')
+            if done_urls:
+                # Ads finished before the interruption are already in the journal
+                remaining = [card for card in ad_cards if urljoin(base_url, card['href']) not in done_urls]
+                METRICS.count('skips_total', len(ad_cards) - len(remaining), reason='resumed')
+                ad_cards = remaining
+
+            # Incremental mode: ads whose card hasn't changed since the last run skip the detail fetch
+            if seen_index is not None:
+                fresh_cards = []
+                for card in ad_cards:
+                    if seen_index.status(post_id_from_url(card['href']), card_fingerprint(card)) == UNCHANGED:
+                        skipped_seen += 1
+                        METRICS.count('skips_total', reason='unchanged')
+                        seen_run += 1
+                        if SEEN_STOP_AFTER and seen_run >= SEEN_STOP_AFTER:
+                            print(fix_arabic(f"   Reached {seen_run} already-seen ads in a row, stopping after this page."))
+                            seen_limit_reached = True
+                            break
+                    else:
+                        seen_run = 0
+                        fresh_cards.append(card)
+                print(fix_arabic(f"   {len(fresh_cards)} new or changed ads."))
+                ad_cards = fresh_cards
+
+            position = 0
+            while position < len(ad_cards):
                 if ad_counter > max_ads:
                     stop_flag = True
                     break
 
-                try:
-                    relative_link = card.get_attribute("href")
-                    if not relative_link:
-                        continue
-                    full_link = urljoin(base_url, relative_link)
+                # Only fetch as many details as could still become rows
+                batch = ad_cards[position:position + int(min(max_ads - ad_counter + 1, len(ad_cards)))]
+                position += len(batch)
+                links = [urljoin(base_url, card['href']) for card in batch]
+                keys = [repost_key(card) if repost_index is not None else None for card in batch]
+                if repost_index is not None:
+                    kept = []
+                    for card, full_link, key in zip(batch, links, keys):
+                        if should_skip_repost(repost_index, journal, current_page, full_link, key):
+                            skipped_reposts += 1
+                        else:
+                            kept.append((card, full_link, key))
+                    batch = [card for card, _, _ in kept]
+                    links = [full_link for _, full_link, _ in kept]
+                    keys = [key for _, _, key in kept]
+                details = resources.fetch_details(links)
+
+                for card, full_link, key, detail in zip(batch, links, keys, details):
+                    if ad_counter > max_ads:
+                        stop_flag = True
+                        break
 
-                    # Data from card
-                    card_text = card.text
                     try:
-                        location_elem = card.find_element(By.CSS_SELECTOR, "div.flex.alignItems.gap-5.darkGrayColor")
-                        location = location_elem.text.strip()
-                    except:
-                        location = "غير محدد"
-
-                    year = extract_year(card_text)
-                    mileage = extract_mileage(card_text)
-                    condition = extract_condition(card_text)
-                    seller_type = extract_seller_type(card)
-
-                    # Initial model extraction
-                    model = extract_model_from_card_and_page(card)
-
-                    # Enter details page
-                    price_text = "N/A"
-                    price_num = np.nan
-                    fuel_type = "غير محدد"
-                    insurance = "لا يوجد تأمين"
-                    transmission = "غير محدد"
-                    color = "غير محدد"
-
-                    if full_link:
-                        try:
-                            driver.execute_script("window.open(arguments[0]);", full_link)
-                            driver.switch_to.window(driver.window_handles[1])
-                            time.sleep(2)
-
-                            page_html = driver.page_source
-                            model = extract_model_from_card_and_page(card, page_html, driver)
-
-                            if year == "N/A":
-                                year = extract_year(driver.find_element(By.TAG_NAME, "body").text)
-
-                            # Extract price
-                            price_text, price_num = extract_price_from_page(driver)
-
-                            # Extract fuel type
-                            fuel_type = extract_fuel_type_advanced(driver)
-
-                            # Advanced installment check
-                            page_text_full = driver.find_element(By.TAG_NAME, "body").text
-                            if is_installment_advanced(price_text, page_text_full, fuel_type, price_num):
-                                print(fix_arabic(f"⏭️ Skipping ad {ad_counter} (installment) - {fuel_type} at {price_num}"))
-                                driver.close()
-                                driver.switch_to.window(driver.window_handles[0])
-                                continue
-
-                            # Remaining data
-                            insurance = extract_insurance_from_page(driver)
-                            transmission = extract_transmission_from_page(driver)
-                            color = extract_color_from_page(driver)
-
-                            driver.close()
-                            driver.switch_to.window(driver.window_handles[0])
-                        except Exception as e:
-                            print(fix_arabic(f"⚠️ Error opening details for ad {ad_counter}: {e}"))
-                            if len(driver.window_handles) > 1:
-                                driver.close()
-                            driver.switch_to.window(driver.window_handles[0])
+                        # An earlier ad of this batch may have claimed the key since the detail fetch
+                        if should_skip_repost(repost_index, journal, current_page, full_link, key):
+                            skipped_reposts += 1
                             continue
 
-                    if model == "غير متوفر" or not model:
-                        model = extract_brand_model_from_text(card_text)
-
-                    all_ads.append({
-                        'ID': ad_counter,
-                        'Model': model,
-                        'Year': year,
-                        'Condition': condition,
-                        'Fuel Type': fuel_type,
-                        'Mileage': mileage,
-                        'Seller Type': seller_type,
-                        'Location': location,
-                        'Price': price_text,
-                        'Insurance': insurance,
-                        'Transmission': transmission,
-                        'Color': color
-                    })
-
-                    print(fix_arabic(f"   ✅ {ad_counter}: {model[:50]}... | {price_text} | {fuel_type}"))
-                    ad_counter += 1
+                        if detail is None:
+                            METRICS.count('errors_total', reason='detail_unavailable')
+                            print(fix_arabic(f"⚠️ Error opening details for ad {ad_counter}: {full_link}"))
+                            continue
 
-                except Exception as e:
-                    print(fix_arabic(f"⚠️ Error processing ad: {e}"))
-                    if len(driver.window_handles) > 1:
-                        driver.close()
-                        driver.switch_to.window(driver.window_handles[0])
-                    continue
+                        row = build_ad_row(card, detail)
+                        if seen_index is not None:
+                            seen_index.mark(post_id_from_url(full_link), card_fingerprint(card), full_link)
 
-            if stop_flag:
-                break
+                        # Advanced installment check
+                        if row is None:
+                            print(fix_arabic(f"⏭️ Skipping ad {ad_counter} (installment) - {detail['fuel_type']} at {detail['price_num']}"))
+                            journal.record_skip(current_page, full_link, 'installment')
+                            METRICS.count('skips_total', reason='installment')
+                            continue
 
-            # Go to next page
-            try:
-                next_button = driver.find_element(By.CSS_SELECTOR, "a[data-id='nextPageArrow']")
-                driver.execute_script("arguments[0].click();", next_button)
-                time.sleep(3)
-                current_page += 1
-            except NoSuchElementException:
-                print(fix_arabic("No more pages."))
+                        row = {'ID': ad_counter, **row}
+                        journal.record_ad(current_page, full_link, row)
+                        output.add(row)
+                        if key:
+                            repost_index.claim(key, post_id_from_url(full_link), full_link)
+                        METRICS.count('ads_total')
+                        print(fix_arabic(f"   ✅ {ad_counter}: {row['Model'][:50]}... | {row['Price']} | {row['Fuel Type']}"))
+                        ad_counter += 1
+
+                    except Exception as e:
+                        METRICS.count('errors_total', reason='parse')
+                        print(fix_arabic(f"⚠️ Error processing ad: {e}"))
+                        continue
+
+                if stop_flag:
+                    break
+
+            if seen_index is not None:
+                seen_index.commit()
+            if repost_index is not None:
+                repost_index.commit()
+            journal.page_done(current_page, ad_counter)
+            resume_page = current_page + 1
+            METRICS.count('pages_total')
+            if seen_limit_reached:
                 break
 
-        except TimeoutException:
+        except PageLoadTimeout:
+            METRICS.count('errors_total', reason='timeout')
             print(fix_arabic("Page load timeout."))
+            interrupted = True
+            break
+        except ListingFetchFailed as e:
+            METRICS.count('errors_total', reason='listing_fetch')
+            print(fix_arabic(f"⚠️ Could not load listing page: {e}"))
+            interrupted = True
             break
         except Exception as e:
+            METRICS.count('errors_total', reason='unexpected')
             print(fix_arabic(f"Unexpected error: {e}"))
+            interrupted = True
             break
 
-    driver.quit()
-
-    # Process and save data
-    if all_ads:
-        df = pd.DataFrame(all_ads)
-        df = df[['ID', 'Model', 'Year', 'Condition', 'Fuel Type', 'Mileage', 'Seller Type', 'Location', 'Price', 'Insurance', 'Transmission', 'Color']]
-
-        # Save Arabic version
-        arabic_file = "cars_arabic.xlsx"
-        df.to_excel(arabic_file, index=False)
-        print(fix_arabic(f"\n✅ Saved Arabic version: {arabic_file}"))
-
-        # Create English version with smart translation
-        print(fix_arabic("🔄 Translating data to English..."))
-        df_en = df.copy()
-
-        # Translate textual fields (except Model)
-        for col in ['Condition', 'Fuel Type', 'Seller Type', 'Location', 'Insurance', 'Transmission', 'Color']:
-            df_en[col] = df_en[col].apply(lambda x: translate_text(x))
-
-        # Translate model using smart translation
-        df_en['Model'] = df_en['Model'].apply(lambda x: translate_car_model_smart(x))
-
-        # Replace invalid values
-        df_en = df_en.replace(['N/A', 'غير محدد', 'غير متوفر', 'لا يوجد تأمين'], np.nan)
-
-        # No ad_id added
-        # Save Kaggle file
-        kaggle_file = "jordan_cars_kaggle.csv"
-        df_en.to_csv(kaggle_file, index=False, encoding='utf-8-sig')
-        print(fix_arabic(f"✅ Saved Kaggle version: {kaggle_file}"))
-
-        # Quick statistics
-        print(fix_arabic("\n📊 Data statistics:"))
-        print(f"Total ads: {len(df_en)}")
-        print(f"Electric cars: {df_en[df_en['Fuel Type'] == 'Electric'].shape[0]}")
-        print(f"Hybrid cars: {df_en[df_en['Fuel Type'] == 'Hybrid'].shape[0]}")
-        print(f"Petrol cars: {df_en[df_en['Fuel Type'] == 'Petrol'].shape[0]}")
-        print(f"Diesel cars: {df_en[df_en['Fuel Type'] == 'Diesel'].shape[0]}")
-
-        # Show sample
-        print(fix_arabic("\n📋 Sample of final data (first 5 rows):"))
-        print(df_en[['Model', 'Year', 'Fuel Type', 'Price']].head())
-
+    if interrupted:
+        print(fix_arabic(f"💾 Progress saved to {JOURNAL_PATH}; run with --resume to continue from page {resume_page}."))
     else:
-        print(fix_arabic("No data found."))
+        journal.finish()
+    journal.close()
+    pages.close()
+    # The repost index may share the seen index's connection, so it is closed first
+    if repost_index is not None:
+        repost_index.close()
+    if seen_index is not None:
+        seen_index.close()
+        print(fix_arabic(f"\n♻️ Incremental mode: skipped {skipped_seen} unchanged ads."))
+    if repost_index is not None:
+        print(fix_arabic(f"🔁 Skipped {skipped_reposts} reposted ads."))
+    if _http_cache is not None:
+        print(fix_arabic(f"🗂️ HTTP cache: {_http_cache.summary()}"))
+    resources.close()
+
+    close_outputs(output, kaggle_writer)
+
+    write_metrics(time.monotonic() - run_start)
+
+def write_metrics(run_seconds, json_path=METRICS_JSON, prometheus_path=METRICS_PROMETHEUS):
+    """Add the run-level gauges and write the instrumentation report as JSON and Prometheus text."""
+    METRICS.set('run_seconds', run_seconds)
+    METRICS.set('pages_per_second', METRICS.total('pages_total') / run_seconds if run_seconds else 0.0)
+    METRICS.set('ads_per_second', METRICS.total('ads_total') / run_seconds if run_seconds else 0.0)
+    if _translation_cache is not None:
+        for result, value in _translation_cache.stats.items():
+            METRICS.set('translation_cache_lookups', value, result=result)
+        METRICS.set('translation_cache_hit_rate', _translation_cache.hit_rate())
+    if _http_cache is not None:
+        for result, value in _http_cache.stats.items():
+            METRICS.set('http_cache_lookups', value, result=result)
+        METRICS.set('http_cache_hit_rate', _http_cache.hit_rate())
+        METRICS.set('http_cache_bytes_saved', _http_cache.bytes_saved)
+    for host, state in RATE_LIMITER.report().items():
+        METRICS.set('host_concurrency_limit', state['limit'], host=host)
+    METRICS.write(json_path, prometheus_path)
+
+    print(fix_arabic(f"\n📈 Run metrics saved to {json_path} and {prometheus_path}"))
+    print(f"   {METRICS.total('pages_total')} pages, {METRICS.total('ads_total')} ads in {run_seconds:.0f}s "
+          f"({METRICS.total('ads_total') / run_seconds if run_seconds else 0:.2f} ads/s), "
+          f"{METRICS.total('skips_total')} skipped, {METRICS.total('errors_total')} errors, "
+          f"{METRICS.total('webdriver_calls_total')} WebDriver calls")
+    for line in METRICS.report():
+        print(line)
+
+# -------------------- Sharded crawling --------------------
+# A full-market snapshot can be split across machines: the coordinator queues shards,
+# workers on every node claim and scrape them, and the merge writes the usual outputs.
+PAGES_PER_SHARD = 10
+
+def run_coordinator(queue_path=DEFAULT_QUEUE_PATH, pages_per_shard=PAGES_PER_SHARD, param=None, values=None):
+    """Split the search into shards (page ranges, or one per query-parameter value) and queue them."""
+    if param:
+        specs = query_shards(SEARCH_URL, param, values)
+    else:
+        resources = CrawlResources()
+        first_page, _, _ = resources.open_listing(SEARCH_URL, BASE_URL)
+        resources.close()
+        if not first_page:
+            print(fix_arabic("⚠️ Could not read the page count, nothing queued."))
+            return
+        specs = page_range_shards(SEARCH_URL, first_page['total_pages'], pages_per_shard)
+    queue = ShardQueue(queue_path)
+    queue.add(specs)
+    queue.close()
+    print(fix_arabic(f"🧩 Queued {len(specs)} shards in {queue_path}."))
+
+def crawl_shard(resources, spec, writer, heartbeat):
+    """Scrape the pages of one shard into writer. heartbeat() renews the lease after every
+    page and returns False once the shard has been handed to another worker.
+    A listing page that can't be loaded raises ListingFetchFailed, so the shard goes back on
+    the queue instead of being completed with the pages it got so far."""
+    start_url = page_url(spec['url'], spec['start_page'])
+    first_page, fetch_listing, listing_concurrency = resources.open_listing(start_url, BASE_URL)
+    pages = PageScheduler(fetch_listing, spec['url'], listing_concurrency).iter_pages(
+        spec['start_page'], first_page, spec['end_page'])
+    try:
+        for page, listing in pages:
+            cards = [card for card in listing['cards'] if card['href']]
+            links = [urljoin(BASE_URL, card['href']) for card in cards]
+            for card, link, detail in zip(cards, links, resources.fetch_details(links)):
+                if detail is None:
+                    METRICS.count('errors_total', reason='detail_unavailable')
+                    continue
+                try:
+                    row = build_ad_row(card, detail)
+                except Exception as e:
+                    METRICS.count('errors_total', reason='parse')
+                    print(fix_arabic(f"⚠️ Error processing ad: {e}"))
+                    continue
+                if row is None:
+                    METRICS.count('skips_total', reason='installment')
+                    continue
+                writer.add(post_id_from_url(link), link, row)
+                METRICS.count('ads_total')
+            METRICS.count('pages_total')
+            print(fix_arabic(f"   📄 Page {page} done, {writer.rows} ads in this shard so far."))
+            if not heartbeat():
+                raise RuntimeError("lease expired, the shard was handed to another worker")
+    finally:
+        pages.close()
+
+def run_worker(queue_path=DEFAULT_QUEUE_PATH, shard_dir=DEFAULT_SHARD_DIR, worker_id=None):
+    """Claim and scrape shards until none is left to retry, writing each shard's rows to shard_dir."""
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    run_start = time.monotonic()
+    queue = ShardQueue(queue_path)
+    resources = CrawlResources()
+    try:
+        while True:
+            claimed = queue.claim(worker_id)
+            if claimed is None:
+                # Nothing due; stay for failed shards still waiting out their retry delay
+                retry_at = queue.next_retry()
+                if retry_at is None:
+                    break
+                time.sleep(max(1.0, retry_at - time.time()))
+                continue
+            shard_id, spec = claimed
+            label = spec.get('label') or f"pages {spec['start_page']}-{spec['end_page']}"
+            print(fix_arabic(f"\n🧩 Worker {worker_id}: shard {shard_id} ({label})"))
+            writer = ShardWriter(shard_dir, shard_id, worker_id)
+            try:
+                crawl_shard(resources, spec, writer, lambda: queue.heartbeat(shard_id, worker_id))
+            except Exception as e:
+                writer.abort()
+                queue.fail(shard_id, worker_id, e)
+                METRICS.count('errors_total', reason='shard')
+                print(fix_arabic(f"⚠️ Shard {shard_id} failed ({type(e).__name__}: {e}). Queue: {queue.progress()}"))
+                continue
+            writer.commit()
+            queue.complete(shard_id, worker_id, writer.rows)
+            print(fix_arabic(f"✅ Shard {shard_id}: {writer.rows} ads. Queue: {queue.progress()}"))
+    finally:
+        resources.close()
+        queue.close()
+    write_metrics(time.monotonic() - run_start,
+                  os.path.join(shard_dir, f"metrics-{worker_id}.json"),
+                  os.path.join(shard_dir, f"metrics-{worker_id}.prom"))
+
+def run_merge(queue_path=DEFAULT_QUEUE_PATH, shard_dir=DEFAULT_SHARD_DIR):
+    """Merge the finished shards into the usual output files, one row per post ID with final IDs."""
+    queue = ShardQueue(queue_path)
+    progress = queue.progress()
+    shard_ids = queue.done_ids()
+    queue.close()
+    unfinished = progress['pending'] + progress['claimed'] + progress['failed']
+    if unfinished:
+        print(fix_arabic(f"⚠️ {unfinished} shards are not finished ({progress}); merging the {len(shard_ids)} that are."))
+
+    output, kaggle_writer = open_outputs()
+    stats = {}
+    for row in iter_merged_rows(shard_dir, shard_ids, stats):
+        output.add(row)
+    print(fix_arabic(f"🧩 Merged {len(shard_ids)} shards: {stats['rows']} ads, "
+                     f"{stats['duplicates']} duplicates dropped by post ID."))
+    close_outputs(output, kaggle_writer)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Scrape used car listings from OpenSooq Jordan.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--resume', action='store_true', help="continue the last interrupted run from its journal")
+    mode.add_argument('--coordinator', action='store_true', help="split the search into shards on the work queue")
+    mode.add_argument('--worker', action='store_true', help="claim and scrape shards from the work queue")
+    mode.add_argument('--merge', action='store_true', help="merge finished shards into the output files")
+    parser.add_argument('--queue', default=DEFAULT_QUEUE_PATH, help="shard work queue (SQLite file shared by all nodes)")
+    parser.add_argument('--shard-dir', default=DEFAULT_SHARD_DIR, help="directory for the partial results of each shard")
+    parser.add_argument('--shard-pages', type=int, default=PAGES_PER_SHARD, help="listing pages per shard")
+    parser.add_argument('--shard-by', type=parse_shard_by, metavar='PARAM=V1,V2,...', help="one shard per value of a query parameter instead of page ranges")
+    parser.add_argument('--worker-id', help="name of this worker (default: host-pid)")
+    parser.add_argument('--max-ads', type=parse_limit, metavar='N|all',
+                        help=f"ads to scrape without asking (default: ${MAX_ADS_ENV}, else ask on a terminal or scrape all)")
+    parser.add_argument('--max-pages', type=parse_limit, metavar='N|all',
+                        help=f"listing pages to scrape at most (default: ${MAX_PAGES_ENV}, else all)")
+    parser.add_argument('--incremental', action='store_true', default=INCREMENTAL,
+                        help="skip ads whose listing card is unchanged since an earlier run and output only new or changed ones")
+    parser.add_argument('--no-repost-dedup', dest='repost_dedup', action='store_false', default=REPOST_DEDUP,
+                        help="keep ads that repost an already-scraped car under a new post ID")
+    args = parser.parse_args()
+    if args.coordinator:
+        param, values = args.shard_by or (None, [])
+        run_coordinator(args.queue, args.shard_pages, param, values)
+    elif args.worker:
+        run_worker(args.queue, args.shard_dir, args.worker_id)
+    elif args.merge:
+        run_merge(args.queue, args.shard_dir)
+    else:
+        main(resume=args.resume,
+             max_ads=args.max_ads if args.max_ads is not None else limit_from_env(MAX_ADS_ENV),
+             max_pages=args.max_pages if args.max_pages is not None else limit_from_env(MAX_PAGES_ENV),
+             incremental=args.incremental, repost_dedup=args.repost_dedup)
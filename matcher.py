@@ -0,0 +1,140 @@
+"""
+Dictionary matching for car titles.
+
+split_car_model used to test every brand, model and trim keyword against the title
+with `in`, which costs O(words x dictionary size) per title. The matchers here are
+built once from the dictionaries and scan the title in time linear in its length,
+while keeping the original priority rules (the first dictionary entry wins).
+"""
+from collections import deque
+
+
+class AhoCorasick:
+    """Aho-Corasick automaton over a list of patterns; matches are reported by pattern index."""
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for index, pattern in enumerate(self.patterns):
+            if not pattern:
+                continue
+            state = 0
+            for ch in pattern:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append(index)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def iter_matches(self, text):
+        """Yield (end_position, pattern_index) for every occurrence of every pattern in text."""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for pos, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for index in out[state]:
+                yield pos, index
+
+    def first_pattern(self, text):
+        """Lowest pattern index occurring in text, or None."""
+        best = None
+        for _, index in self.iter_matches(text):
+            if best is None or index < best:
+                best = index
+        return best
+
+
+class CarNameMatcher:
+    """Brand / model / trim matcher equivalent to the original nested substring scans."""
+
+    def __init__(self, brands, models, trims):
+        self.brands = list(brands)
+        self.models = list(models)
+        self.trim_names = list(trims)
+        self._brand_automaton = AhoCorasick(self.brands)
+        # Models match when the key is inside a word or the word is inside the key
+        self._model_automaton = AhoCorasick(self.models)
+        self._model_substrings = {}
+        for index, key in enumerate(self.models):
+            for start in range(len(key)):
+                for end in range(start + 1, len(key) + 1):
+                    self._model_substrings.setdefault(key[start:end], index)
+        keywords = []
+        self._keyword_trim = []
+        for trim_index, name in enumerate(self.trim_names):
+            for keyword in trims[name]:
+                keywords.append(keyword)
+                self._keyword_trim.append(trim_index)
+        self._trim_automaton = AhoCorasick(keywords)
+
+    def find_brand(self, text):
+        index = self._brand_automaton.first_pattern(text)
+        return self.brands[index] if index is not None else None
+
+    def find_model(self, word):
+        candidates = [i for i in (self._model_automaton.first_pattern(word), self._model_substrings.get(word))
+                      if i is not None]
+        return self.models[min(candidates)] if candidates else None
+
+    def find_trim(self, word_lower):
+        best = None
+        for _, index in self._trim_automaton.iter_matches(word_lower):
+            trim_index = self._keyword_trim[index]
+            if best is None or trim_index < best:
+                best = trim_index
+        return self.trim_names[best] if best is not None else None
+
+    def split(self, text):
+        """Split a car name into brand, model, trim and extra text."""
+        text = text.strip()
+        model = None
+        trim = []
+        remaining = []
+
+        brand = self.find_brand(text)
+        if brand:
+            text = text.replace(brand, '', 1).strip()
+
+        for word in text.split():
+            model = self.find_model(word)
+            if model:
+                text = text.replace(model, '', 1).strip()
+                break
+
+        for word in text.split():
+            trim_name = self.find_trim(word.lower())
+            if trim_name:
+                trim.append(trim_name)
+            else:
+                remaining.append(word)
+
+        extra = ' '.join(remaining).strip()
+        if extra and not model:
+            model = extra
+            extra = ''
+
+        return {
+            'brand': brand,
+            'model': model,
+            'trim': ' '.join(trim) if trim else None,
+            'extra': extra if extra else None
+        }
@@ -0,0 +1,261 @@
+"""
+Lightweight run instrumentation: latency histograms, counters and gauges.
+
+Stages and extractors record their durations into fixed-bucket histograms, and events
+(WebDriver commands, skips, errors, pages, ads) into labelled counters. At the end of a
+run the registry is written as JSON and in the Prometheus text exposition format.
+Registries from worker processes are merged with snapshot()/merge().
+"""
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+PREFIX = "scraper_"
+
+# Upper bounds in seconds, from a cached regex scan to a slow page load
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+HELP = {
+    'stage_seconds': "Time spent per pipeline stage.",
+    'extractor_seconds': "Time spent per extractor call.",
+    'writer_seconds': "Time spent writing and finalizing each output.",
+    'webdriver_calls_total': "WebDriver commands sent, by command.",
+    'http_requests_total': "HTTP requests made, by outcome.",
+    'http_retries_total': "Requests retried after a 429, 5xx, timeout or connection error, by reason.",
+    'host_concurrency_limit': "Adaptive in-flight request limit per host at the end of the run.",
+    'pages_total': "Listing pages processed.",
+    'ads_total': "Ads written to the outputs.",
+    'details_total': "Detail pages obtained, by source.",
+    'skips_total': "Ads skipped, by reason.",
+    'errors_total': "Errors, by reason.",
+    'translation_cache_lookups': "Translation cache lookups, by result.",
+    'translation_cache_hit_rate': "Share of translation cache lookups answered without a backend request.",
+    'http_cache_lookups': "HTTP cache lookups, by result.",
+    'http_cache_hit_rate': "Share of HTTP cache lookups answered from disk (fresh or revalidated with a 304).",
+    'http_cache_bytes_saved': "Characters of page bodies served from the HTTP cache instead of downloaded.",
+    'run_seconds': "Wall-clock duration of the run.",
+    'pages_per_second': "Listing pages processed per second of run time.",
+    'ads_per_second': "Ads written per second of run time.",
+}
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with exact count, sum, min and max."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        for i, n in enumerate(other['counts']):
+            self.counts[i] += n
+        self.count += other['count']
+        self.sum += other['sum']
+        for key, pick in (('min', min), ('max', max)):
+            if other[key] is not None:
+                mine = getattr(self, key)
+                setattr(self, key, other[key] if mine is None else pick(mine, other[key]))
+
+    def quantile(self, q):
+        """Estimate from the buckets, interpolating linearly inside the bucket that holds q."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, n in enumerate(self.counts):
+            upper = self.buckets[i] if i < len(self.buckets) else self.max
+            if n and seen + n >= rank:
+                estimate = lower + (upper - lower) * (rank - seen) / n
+                return min(max(estimate, self.min), self.max)
+            seen += n
+            lower = upper
+        return self.max
+
+    def state(self):
+        return {'counts': list(self.counts), 'count': self.count, 'sum': self.sum, 'min': self.min, 'max': self.max}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """Thread-safe registry of histograms, counters and gauges keyed by name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.started = time.time()
+
+    def observe(self, name, seconds, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name, **labels):
+        """Decorator recording every call of the function under name/labels."""
+        def decorate(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start, **labels)
+            return wrapper
+        return decorate
+
+    def count(self, name, n=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self.gauges[_key(name, labels)] = value
+
+    def total(self, name):
+        """Sum of a counter over all its labels."""
+        with self._lock:
+            return sum(value for (metric, _), value in self.counters.items() if metric == name)
+
+    def snapshot(self):
+        """Picklable copy of the registry, for sending from a worker process."""
+        with self._lock:
+            return {
+                'histograms': {key: h.state() for key, h in self.histograms.items()},
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+            }
+
+    def merge(self, snapshot):
+        with self._lock:
+            for key, state in snapshot['histograms'].items():
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram()
+                histogram.merge(state)
+            for key, value in snapshot['counters'].items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            self.gauges.update(snapshot['gauges'])
+
+    def to_dict(self):
+        with self._lock:
+            histograms = {}
+            for (name, labels), h in sorted(self.histograms.items()):
+                histograms.setdefault(name, []).append({
+                    'labels': dict(labels),
+                    'count': h.count,
+                    'sum': h.sum,
+                    'mean': h.sum / h.count if h.count else None,
+                    'min': h.min,
+                    'p50': h.quantile(0.5),
+                    'p95': h.quantile(0.95),
+                    'p99': h.quantile(0.99),
+                    'max': h.max,
+                    'buckets': {_format_value(le): n for le, n in zip(h.buckets + (float('inf'),), h.counts)},
+                })
+            counters = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                counters.setdefault(name, []).append({'labels': dict(labels), 'value': value})
+            gauges = {}
+            for (name, labels), value in sorted(self.gauges.items()):
+                gauges.setdefault(name, []).append({'labels': dict(labels), 'value': value})
+        return {'started': self.started, 'histograms': histograms, 'counters': counters, 'gauges': gauges}
+
+    def to_prometheus(self):
+        lines = []
+
+        def header(name, kind):
+            full = PREFIX + name
+            if name in HELP:
+                lines.append(f"# HELP {full} {HELP[name]}")
+            lines.append(f"# TYPE {full} {kind}")
+            return full
+
+        with self._lock:
+            last = None
+            for (name, labels), h in sorted(self.histograms.items()):
+                if name != last:
+                    full = header(name, 'histogram')
+                    last = name
+                cumulative = 0
+                for le, n in zip(h.buckets + (float('inf'),), h.counts):
+                    cumulative += n
+                    lines.append(f"{full}_bucket{_format_labels(labels, [('le', _format_value(le))])} {cumulative}")
+                lines.append(f"{full}_sum{_format_labels(labels)} {_format_value(h.sum)}")
+                lines.append(f"{full}_count{_format_labels(labels)} {h.count}")
+            for metrics, kind in ((self.counters, 'counter'), (self.gauges, 'gauge')):
+                last = None
+                for (name, labels), value in sorted(metrics.items()):
+                    if name != last:
+                        full = header(name, kind)
+                        last = name
+                    lines.append(f"{full}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, json_path, prometheus_path):
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        with open(prometheus_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+
+    def report(self, name='stage_seconds', label='stage'):
+        """Summary lines for one histogram family, slowest total first."""
+        with self._lock:
+            rows = [(dict(labels).get(label, ''), h) for (metric, labels), h in self.histograms.items() if metric == name]
+        lines = []
+        for value, h in sorted(rows, key=lambda row: -row[1].sum):
+            lines.append(f"   - {value}: {h.count} calls, {h.sum:.1f}s total, "
+                         f"p50 {h.quantile(0.5) * 1000:.1f} ms, p95 {h.quantile(0.95) * 1000:.1f} ms")
+        return lines
+
+
+METRICS = Metrics()
+
+
+def timed_extractor(func):
+    """Record the latency of every call of an extractor under extractor_seconds{extractor=<name>}."""
+    return METRICS.timed('extractor_seconds', extractor=func.__name__)(func)
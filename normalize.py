@@ -0,0 +1,93 @@
+"""
+Column-wise normalization of the Price, Mileage and Year columns.
+
+convert_arabic_numbers, clean_price_number, mileage_bounds and extract_year in main.py
+work on one string at a time. The functions here apply the same rules to a whole
+pandas Series with vectorized string methods, so historical datasets of 100k rows
+are normalized in well under a second instead of row by row with `.apply`.
+"""
+import pandas as pd
+
+ARABIC_DIGITS = '٠١٢٣٤٥٦٧٨٩'
+
+# Patterns run on pyarrow strings (RE2, where \b only knows ASCII), so word boundaries
+# are spelled out with Latin and Arabic word characters, and the year range is part of
+# the pattern rather than a filter (1900-2025, the same bounds as extract_year)
+WORD = '0-9A-Za-z_\u0600-\u06ff'
+PRICE_RE = r'(\d+[,.]?\d*)'
+NUMBER_RE = r'\d+(?:[,.]\d+)*'
+MILEAGE_RE = rf'(?P<low>{NUMBER_RE})(?:\D+(?P<high>{NUMBER_RE}))?'
+YEAR_RE = rf'(?:^|[^{WORD}])(19[0-9]{{2}}|20[01][0-9]|202[0-5])(?:$|[^{WORD}])'
+
+
+def distinct_text(series):
+    """Distinct string values of a column as pyarrow strings, plus codes mapping rows to them.
+
+    Scraped columns repeat the same few values a lot, so each one is parsed only once;
+    non-strings (NaN, numbers from a previous pass) come out as missing.
+    """
+    codes, uniques = pd.factorize(pd.Series(series, dtype=object))
+    text = pd.Series([u if isinstance(u, str) else None for u in uniques], dtype='string[pyarrow]')
+    return codes, text
+
+
+def broadcast(values, codes, index):
+    """Per-row values from the per-distinct-value results of distinct_text."""
+    return pd.Series(pd.array(values).take(codes, allow_fill=True), index=index)
+
+
+def western_digits(text):
+    """Arabic-Indic digits (١٢٣) converted to Western digits (123)."""
+    for western, arabic in enumerate(ARABIC_DIGITS):
+        text = text.str.replace(arabic, str(western), regex=False)
+    return text
+
+
+def _to_number(numbers, strip, dtype):
+    numbers = numbers.str.replace(strip, '', regex=True)
+    return pd.to_numeric(numbers, errors='coerce').astype(dtype)
+
+
+def parse_price(series):
+    """Price strings to Float64 JOD, <NA> when there is no number (as clean_price_number)."""
+    codes, text = distinct_text(series)
+    text = western_digits(text)
+    price = _to_number(text.str.extract(PRICE_RE, expand=False), ',', 'Float64')
+    return broadcast(price, codes, pd.Series(series).index)
+
+
+def parse_mileage(series):
+    """Mileage strings to numeric (low, high) km bounds, as mileage_bounds.
+
+    "100,000 - 109,999 كم" -> (100000, 109999), "+200,000 كم" -> (200000, <NA>),
+    "50,000 كم" -> (50000, 50000).
+    """
+    codes, text = distinct_text(series)
+    text = western_digits(text)
+    parts = text.str.extract(MILEAGE_RE)
+    open_ended = text.str.strip().str.startswith('+').fillna(False).astype(bool)
+    high = parts['high'].where(parts['high'].notna() | open_ended, parts['low'])
+    index = pd.Series(series).index
+    return (broadcast(_to_number(parts['low'], '[,.]', 'Int32'), codes, index),
+            broadcast(_to_number(high, '[,.]', 'Int32'), codes, index))
+
+
+def parse_year(series):
+    """First plausible model year in each string as Int16, <NA> otherwise (as extract_year)."""
+    codes, text = distinct_text(series)
+    year = pd.to_numeric(western_digits(text).str.extract(YEAR_RE, expand=False)).astype('Int16')
+    return broadcast(year, codes, pd.Series(series).index)
+
+
+def normalize_frame(df):
+    """Typed copy of an output frame: Year, Mileage Low/High and Price as numbers.
+
+    The other columns are kept as they are; Mileage is replaced by its two bounds.
+    """
+    typed = df.drop(columns=['Mileage', 'Price'])
+    low, high = parse_mileage(df['Mileage'])
+    typed.insert(typed.columns.get_loc('Seller Type'), 'Mileage Low', low)
+    typed.insert(typed.columns.get_loc('Seller Type'), 'Mileage High', high)
+    typed.insert(typed.columns.get_loc('Insurance'), 'Price', parse_price(df['Price']))
+    typed['Year'] = parse_year(df['Year'])
+    return typed
@@ -0,0 +1,160 @@
+"""
+Precompiled keyword patterns and a single-pass attribute scanner.
+
+The fuel, transmission, insurance, colour, condition and installment rules used to
+run their own regexes over the full page text. Here every keyword is compiled into
+one trie-shaped alternation and the text is scanned once; each category is then resolved with
+its original priority order (e.g. Hybrid > Diesel > Petrol > Electric).
+
+At each position the longest keyword wins, so a keyword that is a prefix of a longer
+matched one (e.g. 'أزرق' in 'أزرق فاتح') is credited through an implication table;
+scanning resumes one character after each match start to catch overlapping keywords.
+"""
+import re
+
+# Each category lists (value, keywords) in priority order, plus whether keywords need
+# word boundaries and the value used when nothing matches.
+CATEGORIES = {
+    'fuel': {
+        'bounded': True,
+        'default': "غير محدد",
+        'values': [
+            ("هايبرد", ['هايبرد', 'hybrid']),
+            ("ديزل", ['ديزل', 'diesel']),
+            ("بنزين", ['بنزين', 'petrol', 'gasoline']),
+            ("كهرباء", ['كهرباء', 'electric', 'ev']),
+        ],
+    },
+    'transmission': {
+        'bounded': False,
+        'default': None,
+        'values': [
+            ("اوتوماتيك", ['اوتوماتيك', 'automatic', 'اتوماتيك']),
+            ("يدوي", ['يدوي', 'manual', 'عادي']),
+        ],
+    },
+    'insurance': {
+        'bounded': False,
+        'default': "لا يوجد تأمين",
+        'values': [
+            ("تأمين شامل", ['تأمين شامل']),
+            ("تأمين إلزامي", ['تأمين إلزامي']),
+            ("يوجد تأمين", ['تأمين', 'مؤمنة', 'مرخصة']),
+        ],
+    },
+    'color': {
+        'bounded': False,
+        'default': None,
+        'values': [(c, [c]) for c in ['أبيض', 'أسود', 'رمادي', 'فضي', 'أزرق', 'أحمر', 'أخضر', 'بني', 'بيج', 'ذهبي', 'أزرق فاتح']],
+    },
+    'condition': {
+        'bounded': False,
+        'default': "غير محدد",
+        'values': [
+            ("جديد (زيرو)", ['جديد', 'زيرو', 'zero', 'وكالة', 'new']),
+            ("مستعمل", ['مستعمل', 'used']),
+        ],
+    },
+    'installment': {
+        'bounded': True,
+        'default': False,
+        'values': [
+            (True, ['قسط', 'شهري', 'تقسيط', 'installment', 'monthly', 'دفعة أولى', 'دفعة']),
+        ],
+    },
+}
+
+_WORD_CHAR = re.compile(r'\w')
+
+
+def _is_word_char(ch):
+    return bool(_WORD_CHAR.match(ch))
+
+
+def _trie_regex(words):
+    """Alternation shaped like a trie, so each position only tries the branch for its first character.
+    Longer keywords are tried before their prefixes."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = True
+
+    def emit(node):
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return emit(trie)
+
+
+def _build():
+    # keyword -> list of (category, rank)
+    keywords = {}
+    bounded = {}
+    for category, spec in CATEGORIES.items():
+        for rank, (_, words) in enumerate(spec['values']):
+            for word in words:
+                keywords.setdefault(word, []).append((category, rank))
+                bounded[word] = spec['bounded']
+
+    # Keywords found inside another keyword are credited when the outer one matches
+    implied = {}
+    for outer in keywords:
+        credits = list(keywords[outer])
+        for inner in keywords:
+            if inner == outer or inner not in outer:
+                continue
+            start = outer.find(inner)
+            while start != -1:
+                end = start + len(inner)
+                if not bounded[inner]:
+                    ok = True
+                else:
+                    left_ok = (start > 0 and not _is_word_char(outer[start - 1])) or (start == 0 and bounded[outer])
+                    right_ok = (end < len(outer) and not _is_word_char(outer[end])) or (end == len(outer) and bounded[outer])
+                    ok = left_ok and right_ok
+                if ok:
+                    credits.extend(keywords[inner])
+                    break
+                start = outer.find(inner, start + 1)
+        implied[outer.lower()] = credits
+
+    bounded_re = _trie_regex([w.lower() for w in keywords if bounded[w]])
+    unbounded_re = _trie_regex([w.lower() for w in keywords if not bounded[w]])
+    return (
+        re.compile(rf'(?P<bounded>\b(?:{bounded_re})\b)|(?P<unbounded>{unbounded_re})', re.I),
+        {'bounded': re.compile(rf'\b(?:{bounded_re})\b', re.I), 'unbounded': re.compile(unbounded_re, re.I)},
+        implied,
+    )
+
+
+ATTRIBUTE_RE, _BRANCH_RE, _IMPLIED = _build()
+
+
+def scan_attributes(text):
+    """Scan text once and return the detected value of every attribute category."""
+    text = text or ''
+    best = {}
+    match = ATTRIBUTE_RE.search(text)
+    while match:
+        found = [match.group(0)]
+        # A keyword from the other branch may start at the same position
+        other = 'unbounded' if match.lastgroup == 'bounded' else 'bounded'
+        other_match = _BRANCH_RE[other].match(text, match.start())
+        if other_match:
+            found.append(other_match.group(0))
+        for keyword in found:
+            for category, rank in _IMPLIED[keyword.lower()]:
+                if category not in best or rank < best[category]:
+                    best[category] = rank
+        # Resume inside the match so keywords overlapping its tail are still seen
+        match = ATTRIBUTE_RE.search(text, match.start() + 1)
+    result = {}
+    for category, spec in CATEGORIES.items():
+        rank = best.get(category)
+        result[category] = spec['values'][rank][0] if rank is not None else spec['default']
+    return result
@@ -0,0 +1,218 @@
+"""
+Adaptive request pacing shared by every fetch path (listing and detail pages, Wikipedia,
+the translation backend).
+
+Each host gets a token bucket (a hard ceiling on requests per second) and a concurrency
+limit adjusted with AIMD: the limit grows by about one slot per window of fast successful
+requests, and is halved on a 429, a 5xx, a timeout or a connection error, or cut by a
+tenth when latency rises above the target. Failures also put the host on exponential
+backoff with full jitter (or the server's Retry-After), and are retried.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+
+from metrics import METRICS
+
+DEFAULT_RATE = 8.0             # requests per second per host
+DEFAULT_BURST = 8
+DEFAULT_CONCURRENCY = 4        # starting in-flight limit per host
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 16
+LATENCY_TARGET = 2.0           # seconds; slower responses shrink the concurrency limit
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 60.0
+MAX_RETRIES = 3
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+OK = 'ok'
+THROTTLED = 'throttled'
+ERROR = 'error'
+TIMEOUT = 'timeout'
+
+
+class TokenBucket:
+    """rate tokens per second, up to burst saved up; take() blocks until one is available."""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class Attempt:
+    """Outcome of one request inside a slot, set by the caller (defaults to OK)."""
+
+    def __init__(self):
+        self.outcome = OK
+        self.retry_after = None
+
+
+class HostControl:
+    """Token bucket, AIMD concurrency limit and backoff state of one host."""
+
+    def __init__(self, host, rate=DEFAULT_RATE, burst=DEFAULT_BURST, concurrency=DEFAULT_CONCURRENCY,
+                 min_concurrency=MIN_CONCURRENCY, max_concurrency=MAX_CONCURRENCY, latency_target=LATENCY_TARGET):
+        self.host = host
+        self.bucket = TokenBucket(rate, burst)
+        self.limit = float(concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self.failures = 0              # consecutive failed requests
+        self.blocked_until = 0.0
+        self.latency = None            # moving average of successful requests
+        self.error_rate = 0.0          # moving average over all requests
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                wait = self.blocked_until - time.monotonic()
+                if wait <= 0 and self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    break
+                self._cond.wait(timeout=wait if wait > 0 else None)
+        self.bucket.take()
+
+    def release(self, outcome, seconds, retry_after=None):
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            self.error_rate = 0.9 * self.error_rate + 0.1 * (outcome != OK)
+            if outcome == OK:
+                self.failures = 0
+                self.latency = seconds if self.latency is None else 0.8 * self.latency + 0.2 * seconds
+                if self.latency <= self.latency_target:
+                    self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+                else:
+                    self._decrease(now, 0.9)
+            else:
+                self.failures += 1
+                self._decrease(now, 0.5)
+                delay = retry_after if retry_after is not None else \
+                    random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** self.failures))
+                self.blocked_until = max(self.blocked_until, now + delay)
+            self._cond.notify_all()
+
+    def _decrease(self, now, factor):
+        # Requests already in flight when the host pushed back fail together; count that as one signal
+        if now - self._last_decrease >= (self.latency or 1.0):
+            self.limit = max(self.min_concurrency, self.limit * factor)
+            self._last_decrease = now
+
+    def state(self):
+        return {'limit': round(self.limit, 2), 'in_flight': self.in_flight, 'latency': self.latency,
+                'error_rate': round(self.error_rate, 3), 'failures': self.failures}
+
+
+class RateController:
+    """Per-host pacing for all outgoing requests; thread-safe and shared by the whole crawl.
+
+    host_settings maps a host to HostControl keyword arguments (rate, burst, concurrency, ...).
+    """
+
+    def __init__(self, max_retries=MAX_RETRIES, host_settings=None, **defaults):
+        self.max_retries = max_retries
+        self.host_settings = host_settings or {}
+        self.defaults = defaults
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def host(self, url):
+        host = urlparse(url).netloc or url
+        with self._lock:
+            control = self._hosts.get(host)
+            if control is None:
+                control = self._hosts[host] = HostControl(host, **{**self.defaults, **self.host_settings.get(host, {})})
+            return control
+
+    @contextmanager
+    def slot(self, url):
+        """Hold one request slot for url's host. The yielded Attempt's outcome is recorded on
+        exit; an exception escaping the block counts as an error."""
+        control = self.host(url)
+        control.acquire()
+        attempt = Attempt()
+        start = time.perf_counter()
+        try:
+            yield attempt
+        except BaseException:
+            if attempt.outcome == OK:
+                attempt.outcome = ERROR
+            raise
+        finally:
+            control.release(attempt.outcome, time.perf_counter() - start, attempt.retry_after)
+
+    def request(self, session, url, timeout=15, **kwargs):
+        """GET url through session with pacing and retries. Returns the last response (which may
+        still be a 429/5xx once retries run out), or None if every attempt failed to connect."""
+        response = None
+        for attempt_number in range(self.max_retries + 1):
+            with self.slot(url) as attempt:
+                try:
+                    response = session.get(url, timeout=timeout, **kwargs)
+                except requests.Timeout:
+                    attempt.outcome = TIMEOUT
+                    response = None
+                except requests.RequestException:
+                    attempt.outcome = ERROR
+                    response = None
+                else:
+                    if response.status_code in RETRY_STATUSES:
+                        attempt.outcome = THROTTLED if response.status_code == 429 else ERROR
+                        attempt.retry_after = retry_after_seconds(response)
+            if attempt.outcome == OK:
+                return response
+            if attempt_number < self.max_retries:
+                METRICS.count('http_retries_total', reason=attempt.outcome)
+        return response
+
+    def call(self, url, func, retry_on=(Exception,), timeout_on=()):
+        """Run func() in a slot for url's host, retrying with backoff when it raises retry_on.
+        Exceptions in timeout_on count as timeouts. The last exception is re-raised."""
+        for attempt_number in range(self.max_retries + 1):
+            try:
+                with self.slot(url) as attempt:
+                    try:
+                        return func()
+                    except timeout_on:
+                        attempt.outcome = TIMEOUT
+                        raise
+            except retry_on as e:
+                if attempt_number == self.max_retries:
+                    raise
+                METRICS.count('http_retries_total', reason=TIMEOUT if isinstance(e, timeout_on) else ERROR)
+
+    def report(self):
+        with self._lock:
+            return {host: control.state() for host, control in self._hosts.items()}
+
+
+def retry_after_seconds(response, cap=BACKOFF_CAP):
+    """Seconds from a Retry-After header given in seconds (HTTP dates are ignored)."""
+    value = response.headers.get('Retry-After')
+    try:
+        return min(cap, max(0.0, float(value)))
+    except (TypeError, ValueError):
+        return None
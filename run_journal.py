@@ -0,0 +1,95 @@
+"""
+Append-only run journal for checkpointing long crawls.
+
+Every finished ad, every skipped ad and every completed listing page is written as one
+JSON line and fsync'ed, so a crashed or interrupted run can be resumed from the last
+completed page without re-fetching the ads it already finished.
+"""
+import json
+import os
+import time
+
+DEFAULT_JOURNAL_PATH = "run_journal.jsonl"
+
+
+class RunJournal:
+    """Durable JSON Lines journal of a crawl: run settings, finished ads and completed pages."""
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH):
+        self.path = path
+        self._file = None
+
+    def start(self, **settings):
+        """Begin a new run, discarding any previous journal."""
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._write({'type': 'run', 'started': time.time(), **settings})
+
+    def reopen(self):
+        """Continue appending to an existing journal (resume)."""
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._write({'type': 'resume', 'time': time.time()})
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def record_ad(self, page, url, row):
+        self._write({'type': 'ad', 'page': page, 'url': url, 'row': row})
+
+    def record_skip(self, page, url, reason):
+        self._write({'type': 'skip', 'page': page, 'url': url, 'reason': reason})
+
+    def page_done(self, page, ad_counter):
+        self._write({'type': 'page_done', 'page': page, 'ad_counter': ad_counter})
+
+    def finish(self):
+        self._write({'type': 'finished', 'time': time.time()})
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @staticmethod
+    def iter_rows(path=DEFAULT_JOURNAL_PATH):
+        """Yield the rows of finished ads one at a time, without loading the whole journal."""
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('type') == 'ad':
+                    yield record['row']
+
+    @staticmethod
+    def load(path=DEFAULT_JOURNAL_PATH):
+        """Replay a journal into the state needed to resume, or None if there is nothing to resume."""
+        if not os.path.exists(path):
+            return None
+        state = {'settings': {}, 'rows_count': 0, 'done_urls': set(), 'last_page': 0, 'ad_counter': 1, 'finished': False,
+                 'started': None}
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash; everything before it is intact
+                    continue
+                kind = record.get('type')
+                if kind == 'run':
+                    state['settings'] = {k: v for k, v in record.items() if k not in ('type', 'started')}
+                    state['started'] = record.get('started')
+                elif kind == 'ad':
+                    state['rows_count'] += 1
+                    state['done_urls'].add(record['url'])
+                    state['ad_counter'] = max(state['ad_counter'], record['row']['ID'] + 1)
+                elif kind == 'skip':
+                    state['done_urls'].add(record['url'])
+                elif kind == 'page_done':
+                    state['last_page'] = max(state['last_page'], record['page'])
+                    state['ad_counter'] = max(state['ad_counter'], record['ad_counter'])
+                elif kind == 'finished':
+                    state['finished'] = True
+        return state
@@ -0,0 +1,150 @@
+"""
+Persistent index of ads already scraped, for incremental crawls and repost detection.
+
+Each ad is keyed by its OpenSooq post ID (taken from the ad URL) and stores a
+fingerprint of the card-level fields. An ad whose card is unchanged since the last
+run doesn't need its detail page fetched again.
+
+Dealers also repost the same car under a new post ID. RepostIndex maps a content key
+built from normalized card fields (brand and model, year, mileage bucket, location,
+seller type, price) to the first post ID that carried it, so a repost is recognised
+before its detail page is fetched.
+"""
+import hashlib
+import re
+import sqlite3
+import time
+
+DEFAULT_INDEX_PATH = "seen_ads.sqlite3"
+REPOST_WINDOW_DAYS = 30   # an ad last seen longer ago than this no longer claims its content key
+
+NEW = 'new'
+CHANGED = 'changed'
+UNCHANGED = 'unchanged'
+
+
+def post_id_from_url(url):
+    """OpenSooq post ID from an ad URL, or the URL without its query string."""
+    if not url:
+        return None
+    match = re.search(r'/(\d{5,})(?:[/?#-]|$)', url)
+    if match:
+        return match.group(1)
+    return url.split('?', 1)[0].split('#', 1)[0]
+
+
+# Relative timestamps ("منذ 3 ساعات", "2 hours ago") change between runs without the ad changing
+RELATIVE_TIME_RE = re.compile(r'^.*(منذ|\bago\b).*$', re.M | re.I)
+
+
+def card_fingerprint(card):
+    """Hash of the normalized card-level fields; changes when price, title, mileage etc. change."""
+    parts = [card.get(field) or '' for field in ('title', 'text', 'location', 'badge')]
+    parts[1] = RELATIVE_TIME_RE.sub('', parts[1])
+    normalized = '\x1f'.join(re.sub(r'\s+', ' ', part).strip() for part in parts)
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def content_key(parts):
+    """Hash of normalized card fields, or None if any of them is missing (too little to match on)."""
+    if any(part in (None, '') for part in parts):
+        return None
+    normalized = '\x1f'.join(re.sub(r'\s+', ' ', str(part)).strip().lower() for part in parts)
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+class SeenIndex:
+    """SQLite table of post ID -> card fingerprint for ads handled in earlier runs."""
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen_ads ("
+            " post_id TEXT PRIMARY KEY,"
+            " fingerprint TEXT NOT NULL,"
+            " url TEXT,"
+            " first_seen REAL NOT NULL,"
+            " last_seen REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def status(self, post_id, fingerprint):
+        row = self._conn.execute("SELECT fingerprint FROM seen_ads WHERE post_id = ?", (post_id,)).fetchone()
+        if row is None:
+            return NEW
+        return UNCHANGED if row[0] == fingerprint else CHANGED
+
+    def mark(self, post_id, fingerprint, url=None):
+        now = time.time()
+        self._conn.execute(
+            "INSERT INTO seen_ads (post_id, fingerprint, url, first_seen, last_seen) VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT(post_id) DO UPDATE SET fingerprint = excluded.fingerprint, url = excluded.url,"
+            " last_seen = excluded.last_seen",
+            (post_id, fingerprint, url, now, now),
+        )
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
+
+
+class RepostIndex:
+    """Content key -> post ID of the ad whose row was written with it.
+
+    Keys claimed since `since` (the start of this run) always count. With cross_run, keys
+    claimed in earlier runs within window_days count too; a full snapshot leaves that off,
+    so a car whose earlier listing was deleted and reposted is still in it. The keys are
+    loaded into a dict when the index is opened, so lookups never touch the database;
+    claims are written through and saved by commit(). Next to a SeenIndex on the same
+    file, pass it as seen_index so both write through one connection (SQLite lets only one
+    connection hold a write transaction).
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH, window_days=REPOST_WINDOW_DAYS, cross_run=True, since=None,
+                 seen_index=None):
+        self.path = path
+        self._shared = seen_index is not None
+        self._conn = seen_index._conn if self._shared else sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS content_keys ("
+            " content_key TEXT PRIMARY KEY,"
+            " post_id TEXT NOT NULL,"
+            " url TEXT,"
+            " first_seen REAL NOT NULL,"
+            " last_seen REAL NOT NULL)"
+        )
+        self._conn.commit()
+        since = time.time() if since is None else since
+        cutoff = min(since, time.time() - window_days * 86400) if cross_run else since
+        self._owners = dict(self._conn.execute(
+            "SELECT content_key, post_id FROM content_keys WHERE last_seen >= ?", (cutoff,)))
+
+    def original(self, key, post_id):
+        """Post ID of another ad that already owns the content key, or None."""
+        owner = self._owners.get(key)
+        return owner if owner is not None and owner != post_id else None
+
+    def claim(self, key, post_id, url=None):
+        """Make post_id the owner of the key; called once the ad's row has been written.
+        Only the owner's own claims refresh last_seen, so a key ages out once its ad is gone."""
+        now = time.time()
+        self._owners[key] = post_id
+        self._conn.execute(
+            "INSERT INTO content_keys (content_key, post_id, url, first_seen, last_seen) VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT(content_key) DO UPDATE SET"
+            " first_seen = CASE WHEN post_id = excluded.post_id THEN first_seen ELSE excluded.first_seen END,"
+            " post_id = excluded.post_id, url = excluded.url, last_seen = excluded.last_seen",
+            (key, post_id, url, now, now),
+        )
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        self._conn.commit()
+        if not self._shared:
+            self._conn.close()
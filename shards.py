@@ -0,0 +1,198 @@
+"""
+Sharded crawling: a SQLite work queue of shards and the merge of their partial results.
+
+A coordinator splits the search into shards (page ranges of the search URL, or one shard
+per value of a query parameter such as the city) and puts them on the queue. Workers on
+any number of machines sharing the queue file claim shards, scrape them and write each
+shard's rows to its own JSON Lines file. The merge step reads the finished shards,
+drops ads seen in more than one shard by post ID and assigns the final IDs.
+
+Claims are leases: a shard whose worker stops renewing it (crashed or lost machine) is
+handed to another worker after lease_seconds. A failed shard goes back on the queue after
+a delay that doubles with every attempt, so a short outage doesn't use up its attempts.
+"""
+import json
+import os
+import sqlite3
+import time
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+
+DEFAULT_QUEUE_PATH = "shard_queue.sqlite3"
+DEFAULT_SHARD_DIR = "shards"
+DEFAULT_LEASE = 30 * 60        # seconds a claim stays valid without a heartbeat
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_DELAY = 60       # seconds before a failed shard is retried, doubled per attempt
+
+PENDING = 'pending'
+CLAIMED = 'claimed'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def page_range_shards(url, total_pages, pages_per_shard):
+    """Shards covering pages 1..total_pages of url, pages_per_shard pages each."""
+    return [{'url': url, 'start_page': start, 'end_page': min(start + pages_per_shard - 1, total_pages)}
+            for start in range(1, total_pages + 1, pages_per_shard)]
+
+
+def query_shards(url, param, values):
+    """One shard per value of a query parameter (e.g. a city), each crawled until its listing runs out."""
+    parts = urlparse(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != param]
+    return [{'url': urlunparse(parts._replace(query=urlencode(query + [(param, value)]))),
+             'start_page': 1, 'end_page': None, 'label': f"{param}={value}"}
+            for value in values]
+
+
+def shard_result_path(shard_dir, shard_id):
+    return os.path.join(shard_dir, f"shard-{shard_id:05d}.jsonl")
+
+
+class ShardQueue:
+    """SQLite table of shards with lease-based claiming, shared by the coordinator and every worker."""
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH, lease_seconds=DEFAULT_LEASE, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 retry_delay=DEFAULT_RETRY_DELAY):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS shards ("
+            " id INTEGER PRIMARY KEY,"
+            " spec TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " worker TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " heartbeat REAL,"
+            " rows INTEGER,"
+            " error TEXT,"
+            " retry_after REAL)"
+        )
+        # Queue files from before retry backoff
+        if 'retry_after' not in [row[1] for row in self._conn.execute("PRAGMA table_info(shards)")]:
+            self._conn.execute("ALTER TABLE shards ADD COLUMN retry_after REAL")
+
+    def add(self, specs):
+        """Replace the queue with a new set of shards (one coordinator run = one snapshot)."""
+        with self._transaction():
+            self._conn.execute("DELETE FROM shards")
+            self._conn.executemany("INSERT INTO shards (spec, status) VALUES (?, ?)",
+                                   [(json.dumps(spec, ensure_ascii=False), PENDING) for spec in specs])
+
+    def claim(self, worker):
+        """Lease the next due pending (or abandoned) shard to worker, fewest attempts first;
+        returns (id, spec) or None."""
+        now = time.time()
+        with self._transaction():
+            row = self._conn.execute(
+                "SELECT id, spec FROM shards"
+                " WHERE (status = ? AND (retry_after IS NULL OR retry_after <= ?)) OR (status = ? AND heartbeat < ?)"
+                " ORDER BY attempts, id LIMIT 1",
+                (PENDING, now, CLAIMED, now - self.lease_seconds),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE shards SET status = ?, worker = ?, heartbeat = ?, attempts = attempts + 1 WHERE id = ?",
+                (CLAIMED, worker, now, row[0]),
+            )
+        return row[0], json.loads(row[1])
+
+    def heartbeat(self, shard_id, worker):
+        """Renew the lease; False if the shard was meanwhile handed to another worker."""
+        cursor = self._conn.execute(
+            "UPDATE shards SET heartbeat = ? WHERE id = ? AND worker = ? AND status = ?",
+            (time.time(), shard_id, worker, CLAIMED),
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, shard_id, worker, rows):
+        self._conn.execute("UPDATE shards SET status = ?, rows = ?, error = NULL WHERE id = ? AND worker = ?",
+                           (DONE, rows, shard_id, worker))
+
+    def fail(self, shard_id, worker, error):
+        """Put the shard back on the queue, due after retry_delay doubled per attempt made,
+        or mark it failed once it has used up its attempts."""
+        self._conn.execute(
+            "UPDATE shards SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, error = ?,"
+            " retry_after = ? + ? * (1 << (attempts - 1))"
+            " WHERE id = ? AND worker = ?",
+            (self.max_attempts, FAILED, PENDING, str(error), time.time(), self.retry_delay, shard_id, worker),
+        )
+
+    def next_retry(self):
+        """Time the earliest pending shard that is waiting out its retry delay becomes due, or None."""
+        return self._conn.execute("SELECT MIN(retry_after) FROM shards WHERE status = ? AND retry_after IS NOT NULL",
+                                  (PENDING,)).fetchone()[0]
+
+    def progress(self):
+        counts = {PENDING: 0, CLAIMED: 0, DONE: 0, FAILED: 0}
+        for status, n in self._conn.execute("SELECT status, COUNT(*) FROM shards GROUP BY status"):
+            counts[status] = n
+        return counts
+
+    def done_ids(self):
+        return [row[0] for row in self._conn.execute("SELECT id FROM shards WHERE status = ? ORDER BY id", (DONE,))]
+
+    def close(self):
+        self._conn.close()
+
+    def _transaction(self):
+        return _Immediate(self._conn)
+
+
+class _Immediate:
+    """BEGIN IMMEDIATE ... COMMIT, so concurrent claims from several processes can't pick the same shard."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, *exc):
+        self._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+class ShardWriter:
+    """Partial results of one shard, written to a .part file and moved into place once the shard is done."""
+
+    def __init__(self, shard_dir, shard_id, worker):
+        os.makedirs(shard_dir, exist_ok=True)
+        self.path = shard_result_path(shard_dir, shard_id)
+        # Per worker, in case an expired lease has the shard scraped twice at once
+        self._part = f"{self.path}.{worker}.part"
+        self._file = open(self._part, 'w', encoding='utf-8')
+        self.rows = 0
+
+    def add(self, post_id, url, row):
+        self._file.write(json.dumps({'post_id': post_id, 'url': url, 'row': row}, ensure_ascii=False) + '\n')
+        self.rows += 1
+
+    def commit(self):
+        self._file.close()
+        os.replace(self._part, self.path)
+
+    def abort(self):
+        self._file.close()
+        os.remove(self._part)
+
+
+def iter_merged_rows(shard_dir, shard_ids, stats=None):
+    """Rows of the finished shards in shard order, each ad once (first occurrence by post ID),
+    numbered with final IDs from 1. stats, if given, receives 'rows' and 'duplicates' counts."""
+    stats = stats if stats is not None else {}
+    stats.update(rows=0, duplicates=0)
+    seen = set()
+    for shard_id in shard_ids:
+        with open(shard_result_path(shard_dir, shard_id), encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                if record['post_id'] in seen:
+                    stats['duplicates'] += 1
+                    continue
+                seen.add(record['post_id'])
+                stats['rows'] += 1
+                yield {'ID': stats['rows'], **record['row']}
@@ -0,0 +1,306 @@
+"""
+Structured data embedded in a page: JSON-LD blocks, JSON data scripts and inline state.
+
+Every <script> of a page is visited in one pass and each JSON blob in it is decoded once,
+with orjson when it is installed. The Vehicle item of the JSON-LD and the ad record of any
+hydration state (a framework's page data, or `window.__STATE__ = {...}` assignments) are
+mapped onto the output fields, normalized to the values the DOM and text heuristics in
+main.py produce. Those heuristics then only run for the fields still missing.
+"""
+import json
+import re
+from collections import deque
+
+from patterns import scan_attributes
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+TYPE_RE = re.compile(r'''\btype\s*=\s*["']?([^"'\s>]+)''', re.I)
+# `window.__APP_STATE__ = {...};`, `var data = [...]`
+ASSIGNMENT_RE = re.compile(r'^\s*(?:var\s+|let\s+|const\s+)?[\w$.]+\s*=\s*(?=[{\[])')
+
+# Keys an ad record uses for each field in order of preference, compared lowercased without '_' and '-'
+FIELD_KEYS = {
+    'model': ['name', 'model', 'title', 'posttitle'],
+    'price': ['price', 'pricevalue', 'postprice'],
+    'currency': ['pricecurrency', 'currency'],
+    'fuel_type': ['fueltype', 'fuel'],
+    'transmission': ['transmission', 'vehicletransmission', 'transmissiontype', 'gearbox'],
+    'color': ['color', 'colour', 'exteriorcolor'],
+    'mileage': ['mileage', 'mileagefromodometer', 'kilometers', 'odometer'],
+    'year': ['year', 'modelyear', 'vehiclemodeldate', 'productiondate', 'manufactureyear'],
+    'condition': ['condition', 'itemcondition', 'vehiclecondition'],
+    'insurance': ['insurance'],
+}
+# Labels of attribute lists ([{"label": "نوع الوقود", "value": "بنزين"}, ...]), as on the page
+FIELD_LABELS = {
+    'fuel_type': ['نوع الوقود', 'الوقود'],
+    'transmission': ['ناقل الحركة'],
+    'color': ['اللون'],
+    'mileage': ['عداد المسافة', 'المسافة المقطوعة', 'الكيلومترات'],
+    'year': ['سنة الصنع', 'السنة'],
+    'condition': ['الحالة'],
+    'insurance': ['التأمين'],
+}
+LABEL_KEYS = ['label', 'fieldlabel', 'key', 'name']
+VALUE_KEYS = ['value', 'optionlabel', 'valuelabel', 'text']
+# A hydration dict counts as the ad record with at least this many of the fields below
+RECORD_FIELDS = ['price', 'fuel_type', 'transmission', 'color', 'mileage', 'year']
+MIN_RECORD_FIELDS = 2
+# Keys holding a record's post ID, matched against the ID in the page URL
+ID_KEYS = ['id', 'postid', 'adid', 'listingid']
+
+# Same priority as the fuel rules for JSON-LD and the labelled spec rows
+FUEL_VALUES = [
+    ('electric', "كهرباء"), ('كهرباء', "كهرباء"),
+    ('hybrid', "هايبرد"), ('هايبرد', "هايبرد"),
+    ('diesel', "ديزل"), ('ديزل', "ديزل"),
+    ('petrol', "بنزين"), ('gasoline', "بنزين"), ('بنزين', "بنزين"),
+]
+COLOR_VALUES = {
+    'white': 'أبيض', 'black': 'أسود', 'gray': 'رمادي', 'grey': 'رمادي', 'silver': 'فضي', 'blue': 'أزرق',
+    'red': 'أحمر', 'green': 'أخضر', 'brown': 'بني', 'beige': 'بيج', 'gold': 'ذهبي', 'light blue': 'أزرق فاتح',
+}
+PRICE_RANGE = (1000, 200000)
+YEAR_RANGE = (1900, 2025)
+
+VEHICLE_TYPES = ('Vehicle', 'Car')
+
+_KEY_TO_FIELD = {key: (field, rank) for field, keys in FIELD_KEYS.items() for rank, key in enumerate(keys)}
+_LABEL_TO_FIELD = {label: (field, rank) for field, labels in FIELD_LABELS.items() for rank, label in enumerate(labels)}
+
+
+def _norm_key(key):
+    return key.lower().replace('_', '').replace('-', '') if isinstance(key, str) else ''
+
+
+def iter_scripts(html):
+    """Yield (attributes, body) of every <script> element.
+    Plain str.find rather than a lazy regex, which crawls through large inline bundles a character at a time."""
+    pos = 0
+    while True:
+        start = html.find('<script', pos)
+        if start == -1:
+            return
+        open_end = html.find('>', start)
+        close = html.find('</script', open_end)
+        if open_end == -1 or close == -1:
+            return
+        yield html[start + 7:open_end], html[open_end + 1:close]
+        pos = close + 8
+
+
+def iter_blobs(html):
+    """Yield (kind, data) for every decodable JSON blob in the page's scripts.
+    kind is 'json_ld' or 'state'; blobs that fail to decode are skipped."""
+    for attributes, body in iter_scripts(html or ''):
+        type_match = TYPE_RE.search(attributes)
+        script_type = type_match.group(1).lower() if type_match else ''
+        if script_type == 'application/ld+json':
+            kind = 'json_ld'
+        elif script_type == 'application/json':
+            kind = 'state'
+        elif script_type in ('', 'text/javascript', 'module'):
+            assignment = ASSIGNMENT_RE.match(body)
+            if not assignment:
+                continue
+            kind = 'state'
+            body = body[assignment.end():].rstrip().rstrip(';')
+        else:
+            continue
+        try:
+            yield kind, _loads(body)
+        except ValueError:
+            continue
+
+
+def find_vehicle(data):
+    """The schema.org Vehicle (or Car) item of a JSON-LD blob (a single item or a list of them)."""
+    items = data if isinstance(data, list) else [data]
+    for item in items:
+        if isinstance(item, dict) and item.get('@type') in VEHICLE_TYPES:
+            return item
+    return None
+
+
+def _scalar(value):
+    """Plain value of a JSON-LD/hydration field: QuantitativeValue, Offer or {'name': ...} dicts unwrapped."""
+    if isinstance(value, dict):
+        for key in ('value', 'name', 'label', 'price', 'amount'):
+            if key in value:
+                return _scalar(value[key])
+        return None
+    if isinstance(value, list):
+        return _scalar(value[0]) if value else None
+    return value
+
+
+def raw_fields(record):
+    """{field: raw value} from one ad record: its own keys, offers, and label/value attribute lists.
+    When several keys map to the same field, the earliest in FIELD_KEYS/FIELD_LABELS wins."""
+    fields = {}
+    ranks = {}
+
+    def put(field, rank, value):
+        value = _scalar(value)
+        if value not in (None, '') and rank < ranks.get(field, float('inf')):
+            fields[field] = value
+            ranks[field] = rank
+
+    for key, value in record.items():
+        norm = _norm_key(key)
+        if norm in _KEY_TO_FIELD:
+            field, rank = _KEY_TO_FIELD[norm]
+            if field == 'price' and isinstance(value, dict):
+                put('currency', 0, value.get('priceCurrency') or value.get('currency'))
+            put(field, rank, value)
+        elif norm == 'offers':
+            offer = value[0] if isinstance(value, list) and value else value
+            if isinstance(offer, dict):
+                put('price', 0, offer.get('price'))
+                put('currency', 0, offer.get('priceCurrency'))
+        elif isinstance(value, list):
+            for item in value:
+                if not isinstance(item, dict):
+                    continue
+                label = next((item[k] for k in item if _norm_key(k) in LABEL_KEYS and isinstance(item[k], str)), None)
+                if label and label.strip() in _LABEL_TO_FIELD:
+                    field, rank = _LABEL_TO_FIELD[label.strip()]
+                    put(field, rank, next((item[k] for k in item if _norm_key(k) in VALUE_KEYS), None))
+    return fields
+
+
+def _has_post_id(record, post_id):
+    return any(_norm_key(key) in ID_KEYS and str(value) == post_id
+               for key, value in record.items() if isinstance(value, (str, int)))
+
+
+def find_record(data, post_id=None, max_nodes=50000):
+    """Raw fields of the ad record in a hydration blob: a dict with at least MIN_RECORD_FIELDS
+    ad fields. Page state also carries similar and recommended ads, so with a post_id only the
+    record whose ID it is (or that sits inside it) counts; without one, the shallowest record,
+    the first in document order on a tie. None if there is no such record."""
+    queue = deque([(data, post_id is None)])
+    visited = 0
+    while queue and visited < max_nodes:
+        node, in_match = queue.popleft()
+        visited += 1
+        if isinstance(node, dict):
+            in_match = in_match or _has_post_id(node, post_id)
+            fields = raw_fields(node)
+            if in_match and sum(1 for field in RECORD_FIELDS if field in fields) >= MIN_RECORD_FIELDS:
+                return fields
+            children = node.values()
+        elif isinstance(node, list):
+            children = node
+        else:
+            continue
+        queue.extend((v, in_match) for v in children if isinstance(v, (dict, list)))
+    return None
+
+
+# -------------------- Value normalization --------------------
+def normalize_price(value, currency):
+    """(price text, number) in the format of the JSON-LD price rule, or None outside PRICE_RANGE."""
+    try:
+        num = value if isinstance(value, (int, float)) else float(str(value).replace(',', ''))
+    except ValueError:
+        return None
+    if PRICE_RANGE[0] <= num <= PRICE_RANGE[1]:
+        return f"{value} {currency or 'دينار'}", num
+    return None
+
+
+def normalize_year(value):
+    match = re.search(r'\d{4}', str(value))
+    if match and YEAR_RANGE[0] <= int(match.group(0)) <= YEAR_RANGE[1]:
+        return match.group(0)
+    return None
+
+
+def normalize_mileage(value):
+    if isinstance(value, (int, float)):
+        return f"{int(value):,} كم"
+    text = str(value).strip()
+    if not re.search(r'\d', text):
+        return None
+    return text if re.search(r'كم|كيلومتر|km', text, re.I) else f"{text} كم"
+
+
+def normalize_fuel(value):
+    text = str(value).lower()
+    return next((fuel for keyword, fuel in FUEL_VALUES if keyword in text), None)
+
+
+def normalize_color(value):
+    text = str(value).strip()
+    return COLOR_VALUES.get(text.lower()) or scan_attributes(text)['color'] or text or None
+
+
+def normalize_attribute(category):
+    def normalize(value):
+        found = scan_attributes(str(value))[category]
+        return None if found in (None, False, "غير محدد", "لا يوجد تأمين") else found
+    return normalize
+
+
+NORMALIZERS = {
+    'model': lambda value: str(value).strip() or None,
+    'year': normalize_year,
+    'fuel_type': normalize_fuel,
+    'transmission': normalize_attribute('transmission'),
+    'color': normalize_color,
+    'mileage': normalize_mileage,
+    'condition': normalize_attribute('condition'),
+    'insurance': normalize_attribute('insurance'),
+}
+
+
+def normalize_fields(raw):
+    fields = {}
+    if 'price' in raw:
+        price = normalize_price(raw['price'], raw.get('currency'))
+        if price:
+            fields['price'] = price
+    for field, normalize in NORMALIZERS.items():
+        if field in raw:
+            value = normalize(raw[field])
+            if value:
+                fields[field] = value
+    return fields
+
+
+class StructuredData:
+    """Embedded JSON of one page, decoded once: the JSON-LD Vehicle and the normalized output fields.
+
+    fields may hold 'model', 'year', 'price' (text, number), 'fuel_type', 'transmission',
+    'color', 'mileage', 'condition' and 'insurance'; JSON-LD wins over hydration state.
+    With post_id (the ad's ID from its URL) only hydration records carrying that ID are
+    used, so other ads listed in the page state never fill in this ad's fields.
+    """
+
+    def __init__(self, html, post_id=None):
+        self.json_ld = None
+        records = []
+        for kind, data in iter_blobs(html):
+            if kind == 'json_ld':
+                vehicle = find_vehicle(data)
+                if vehicle is not None and self.json_ld is None:
+                    self.json_ld = vehicle
+            else:
+                record = find_record(data, post_id)
+                if record:
+                    records.append(record)
+        self.fields = normalize_fields(raw_fields(self.json_ld)) if self.json_ld else {}
+        for raw in records:
+            # A hydration 'title' or 'name' is too generic to stand for the model
+            raw.pop('model', None)
+            for field, value in normalize_fields(raw).items():
+                self.fields.setdefault(field, value)
+
+    def get(self, field, default=None):
+        return self.fields.get(field, default)
@@ -0,0 +1,124 @@
+"""
+Persistent cache for translation lookups (GoogleTranslator, Wikipedia).
+
+Entries are stored in a local SQLite file keyed by (backend, source text, target
+language) with a small in-memory LRU in front. Failed lookups are cached too
+(as None) with a shorter TTL, so the same unknown string isn't retried on every row.
+"""
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CACHE_PATH = "translation_cache.sqlite3"
+DEFAULT_TTL = 30 * 24 * 3600          # successful translations: 30 days
+DEFAULT_NEGATIVE_TTL = 24 * 3600      # failed lookups: retried after a day
+DEFAULT_MEMORY_SIZE = 4096
+
+MISSING = object()
+
+
+class TranslationCache:
+    """SQLite-backed translation cache with an in-memory LRU, TTL expiry and hit/miss counters."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL,
+                 memory_size=DEFAULT_MEMORY_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.memory_size = memory_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            " backend TEXT NOT NULL,"
+            " source TEXT NOT NULL,"
+            " target TEXT NOT NULL,"
+            " value TEXT,"
+            " created REAL NOT NULL,"
+            " PRIMARY KEY (backend, source, target))"
+        )
+        self._conn.commit()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'negative_hits': 0, 'misses': 0, 'expired': 0}
+
+    def _expires_at(self, value, created):
+        return created + (self.ttl if value is not None else self.negative_ttl)
+
+    def _remember(self, key, value, expires_at):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, backend, text, target):
+        """Return the cached value (None for a cached failure) or MISSING."""
+        key = (backend, text, target)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    if value is None:
+                        self.stats['negative_hits'] += 1
+                    return value
+                del self._memory[key]
+
+            row = self._conn.execute(
+                "SELECT value, created FROM translations WHERE backend = ? AND source = ? AND target = ?",
+                key,
+            ).fetchone()
+            if row is not None:
+                value, created = row
+                expires_at = self._expires_at(value, created)
+                if expires_at > now:
+                    self._remember(key, value, expires_at)
+                    self.stats['disk_hits'] += 1
+                    if value is None:
+                        self.stats['negative_hits'] += 1
+                    return value
+                self.stats['expired'] += 1
+                self._conn.execute(
+                    "DELETE FROM translations WHERE backend = ? AND source = ? AND target = ?", key)
+                self._conn.commit()
+
+            self.stats['misses'] += 1
+            return MISSING
+
+    def set(self, backend, text, target, value):
+        """Store a translation; value=None records a failed lookup."""
+        key = (backend, text, target)
+        created = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO translations (backend, source, target, value, created) VALUES (?, ?, ?, ?, ?)",
+                (backend, text, target, value, created),
+            )
+            self._conn.commit()
+            self._remember(key, value, self._expires_at(value, created))
+
+    def lookup(self, backend, text, target, fetch):
+        """Return the cached value, or call fetch() and cache whatever it returns (None = failure)."""
+        value = self.get(backend, text, target)
+        if value is MISSING:
+            value = fetch()
+            self.set(backend, text, target, value)
+        return value
+
+    def hit_rate(self):
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        total = hits + self.stats['misses']
+        return hits / total if total else 0.0
+
+    def summary(self):
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        return (f"{hits} hits ({self.stats['memory_hits']} memory, {self.stats['disk_hits']} disk, "
+                f"{self.stats['negative_hits']} negative), {self.stats['misses']} misses, "
+                f"hit rate {self.hit_rate():.0%}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,199 @@
+"""
+Streaming writers for the Arabic and English outputs.
+
+Rows are buffered and flushed to disk in fixed-size chunks as ads are scraped, so
+memory stays flat however many ads a run collects. The Arabic workbook uses
+openpyxl's write-only mode; English rows are translated once per chunk and appended
+to the CSV and to a typed Parquet file.
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import Workbook
+
+from metrics import METRICS
+
+OUTPUT_COLUMNS = ['ID', 'Model', 'Year', 'Condition', 'Fuel Type', 'Mileage', 'Seller Type', 'Location', 'Price', 'Insurance', 'Transmission', 'Color']
+INVALID_VALUES = ['N/A', 'غير محدد', 'غير متوفر', 'لا يوجد تأمين']
+DEFAULT_CHUNK_SIZE = 500
+
+# Typed columnar export: numeric price/mileage/year, dictionary-encoded low-cardinality columns
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+PARQUET_SCHEMA = pa.schema([
+    ('Snapshot Date', pa.date32()),
+    ('ID', pa.int64()),
+    ('Model', pa.string()),
+    ('Year', pa.int16()),
+    ('Condition', CATEGORY),
+    ('Fuel Type', CATEGORY),
+    ('Mileage Low', pa.int32()),
+    ('Mileage High', pa.int32()),
+    ('Seller Type', CATEGORY),
+    ('Location', CATEGORY),
+    ('Price', pa.float64()),
+    ('Insurance', CATEGORY),
+    ('Transmission', CATEGORY),
+    ('Color', CATEGORY),
+])
+PARQUET_ROW_GROUP_ROWS = 10_000
+
+
+class ArabicExcelWriter:
+    """Original Arabic rows, streamed into an .xlsx workbook."""
+
+    def __init__(self, path):
+        self.path = path
+        self.rows_written = 0
+        self._workbook = None
+        self._sheet = None
+
+    def write_rows(self, rows):
+        if self._workbook is None:
+            self._workbook = Workbook(write_only=True)
+            self._sheet = self._workbook.create_sheet()
+            self._sheet.append(OUTPUT_COLUMNS)
+        for row in rows:
+            self._sheet.append([row.get(col) for col in OUTPUT_COLUMNS])
+        self.rows_written += len(rows)
+
+    def close(self):
+        if self._workbook is not None:
+            self._workbook.save(self.path)
+            self._workbook = None
+
+
+class EnglishOutputs:
+    """Translates each chunk once with `translate(df)` and hands the English frame to several writers."""
+
+    def __init__(self, translate, writers):
+        self.translate = translate
+        self.writers = writers
+
+    def write_rows(self, rows):
+        df = pd.DataFrame(rows, columns=OUTPUT_COLUMNS)
+        df = self.translate(df)
+        df = df.replace(INVALID_VALUES, np.nan)
+        for writer in self.writers:
+            with METRICS.timer('writer_seconds', writer=type(writer).__name__, op='write'):
+                writer.write_frame(df)
+
+    def close(self):
+        for writer in self.writers:
+            with METRICS.timer('writer_seconds', writer=type(writer).__name__, op='close'):
+                writer.close()
+
+
+class EnglishCsvWriter:
+    """English rows for Kaggle, appended to the CSV chunk by chunk.
+
+    Keeps running fuel-type counts and the first rows so the end-of-run summary doesn't
+    need the full dataset in memory.
+    """
+
+    SAMPLE_SIZE = 5
+
+    def __init__(self, path):
+        self.path = path
+        self.rows_written = 0
+        self.fuel_counts = {}
+        self.sample = None
+        self._file = None
+
+    def write_frame(self, df):
+        first_chunk = self._file is None
+        if first_chunk:
+            self._file = open(self.path, 'w', encoding='utf-8-sig', newline='')
+        df.to_csv(self._file, header=first_chunk, index=False)
+        self._file.flush()
+
+        self.rows_written += len(df)
+        for fuel, count in df['Fuel Type'].value_counts().items():
+            self.fuel_counts[fuel] = self.fuel_counts.get(fuel, 0) + int(count)
+        if self.sample is None or len(self.sample) < self.SAMPLE_SIZE:
+            head = df[['Model', 'Year', 'Fuel Type', 'Price']].head(self.SAMPLE_SIZE)
+            self.sample = head if self.sample is None else pd.concat([self.sample, head], ignore_index=True).head(self.SAMPLE_SIZE)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class TypedParquetWriter:
+    """English rows as a typed Parquet file.
+
+    `to_typed(df)` turns a translated chunk into the PARQUET_SCHEMA columns (numbers parsed,
+    invalid values as nulls). Chunks are buffered into row groups of row_group_rows, each
+    written with min/max statistics so readers can filter with predicate pushdown.
+    """
+
+    def __init__(self, path, to_typed, row_group_rows=PARQUET_ROW_GROUP_ROWS, snapshot_date=None):
+        self.path = path
+        self.to_typed = to_typed
+        self.row_group_rows = row_group_rows
+        self.snapshot_date = snapshot_date or datetime.date.today()
+        self.rows_written = 0
+        self._writer = None
+        self._pending = []
+        self._pending_rows = 0
+
+    def write_frame(self, df):
+        typed = self.to_typed(df)
+        typed.insert(0, 'Snapshot Date', self.snapshot_date)
+        self._pending.append(pa.Table.from_arrays(
+            [pa.array(typed[field.name], type=field.type, from_pandas=True) for field in PARQUET_SCHEMA],
+            schema=PARQUET_SCHEMA,
+        ))
+        self._pending_rows += len(typed)
+        if self._pending_rows >= self.row_group_rows:
+            self._write_row_group()
+
+    def _write_row_group(self):
+        if not self._pending:
+            return
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, PARQUET_SCHEMA, compression='zstd', write_statistics=True)
+        table = pa.concat_tables(self._pending).unify_dictionaries()
+        self._writer.write_table(table, row_group_size=self.row_group_rows)
+        self.rows_written += table.num_rows
+        self._pending = []
+        self._pending_rows = 0
+
+    def close(self):
+        self._write_row_group()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class StreamingOutput:
+    """Buffers rows and flushes them to every writer once chunk_size rows have accumulated."""
+
+    def __init__(self, writers, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.writers = writers
+        self.chunk_size = chunk_size
+        self.rows_written = 0
+        self._buffer = []
+
+    def add(self, row):
+        self._buffer.append(row)
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        for writer in self.writers:
+            with METRICS.timer('writer_seconds', writer=type(writer).__name__, op='write'):
+                writer.write_rows(self._buffer)
+        self.rows_written += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        self.flush()
+        for writer in self.writers:
+            with METRICS.timer('writer_seconds', writer=type(writer).__name__, op='close'):
+                writer.close()